@@ -1,12 +1,28 @@
--- Create an external table that points to the S3 bucket
-CREATE EXTERNAL TABLE IF NOT EXISTS advent_of_code_output (
-    line STRING
+-- Per-line calibration results written by day1.lambda_handler with EMIT_LINES=on,
+-- stored as Snappy-compressed Parquet and partitioned by source key and run date
+CREATE EXTERNAL TABLE IF NOT EXISTS calibration_lines (
+    line_number BIGINT,
+    first_digit TINYINT,
+    last_digit TINYINT,
+    value INT,
+    part TINYINT
 )
-ROW FORMAT DELIMITED
-FIELDS TERMINATED BY '\n'
-STORED AS TEXTFILE
-LOCATION 's3://advent-of-code-day/';
+PARTITIONED BY (source STRING, run_date STRING)
+STORED AS PARQUET
+LOCATION 's3://advent-of-code-day/calibration_lines/'
+TBLPROPERTIES (
+    'parquet.compression'='SNAPPY',
+    'projection.enabled'='true',
+    'projection.source.type'='injected',
+    'projection.run_date.type'='date',
+    'projection.run_date.format'='yyyy-MM-dd',
+    'projection.run_date.range'='2023-12-01,NOW',
+    'storage.location.template'='s3://advent-of-code-day/calibration_lines/source=${source}/run_date=${run_date}/'
+);
 
--- Query the data from the external table
-SELECT line
-FROM advent_of_code_output;
+-- Query one input's results from today's run (UTC); only that partition is scanned.
+-- day1 removes a source's partitions from earlier days, so each line is stored once
+SELECT part, count(*) AS lines, sum(value) AS total
+FROM calibration_lines
+WHERE source = 'input.txt' AND run_date = date_format(current_date, '%Y-%m-%d')
+GROUP BY part;
@@ -0,0 +1,340 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from multiprocessing import Pipe, Process
+
+import day1
+from day1 import stream_calibration_sum
+from local_aws import LocalFile, LocalS3
+
+# Bucket and key the benchmark input is served under by LocalS3
+BENCH_BUCKET = 'advent-of-code-day'
+BENCH_KEY = 'input.txt'
+# legacy is the original list-comprehension loop, part1 and part2 go through the handler's streaming path
+MODES = ('legacy', 'part1', 'part2')
+# Distinct synthetic lines generated before sampling them into the output
+SYNTHETIC_POOL_SIZE = 100000
+
+
+def legacy_calibration_sum(lines):
+    # The original per-character implementation from lambda_handler
+    total = []
+    for line in lines:
+        digits = [char for char in line if char.isdigit()]
+        if digits:  # Check if there are any digits in the line
+            first_digit = digits[0]
+            last_digit = digits[-1]
+            number = int(first_digit + last_digit)
+            total.append(number)
+    return sum(total)
+
+
+class RepeatedBody:
+    """File-like body that returns the same data `times` times over
+
+    Lets the benchmark scale input.txt up without holding the result in memory.
+    """
+
+    def __init__(self, data, times):
+        if not data.endswith(b'\n'):
+            data += b'\n'
+        self.data = data
+        self.times = times
+        self.size = len(data) * times
+        self.position = 0
+
+    def read(self, size=-1):
+        if size < 0:
+            size = self.size - self.position
+        size = min(size, self.size - self.position)
+        if size <= 0:
+            return b''
+        start = self.position % len(self.data)
+        chunk = (self.data * (size // len(self.data) + 2))[start:start + size]
+        self.position += size
+        return chunk
+
+
+def repeated_lines(data, times):
+    lines = data.decode('utf-8').splitlines()
+    for _ in range(times):
+        yield from lines
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def parse_size(text):
+    # "64MB", "10GB", "512KB" or a plain byte count
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*', text.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid size: {text}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** ' KMGT'.index(unit or ' '))
+
+
+def profile_input(input_file):
+    """Measure the line lengths and the mix of digits, digit words and other letters in an input"""
+    words = re.compile(b'|'.join(day1.DIGIT_WORDS))
+    profile = {'line_lengths': [], 'digits': 0, 'words': 0, 'letters': 0}
+    with open(input_file, 'rb') as file:
+        for line in file:
+            line = line.rstrip(b'\r\n')
+            if not line:
+                continue
+            digits = sum(1 for byte in line if 48 <= byte <= 57)
+            word_matches = words.findall(line)
+            profile['line_lengths'].append(len(line))
+            profile['digits'] += digits
+            profile['words'] += len(word_matches)
+            profile['letters'] += len(line) - digits - sum(len(word) for word in word_matches)
+    return profile
+
+
+def synthetic_line(profile, rng):
+    """Build one line with a real line length and the same token mix as the profiled input
+
+    Like the real puzzle input, every line holds at least one numeric digit.
+    """
+    words = list(day1.DIGIT_WORDS)
+    length = rng.choice(profile['line_lengths'])
+    weights = (profile['digits'], profile['words'], profile['letters'])
+    line = bytearray()
+    while len(line) < length:
+        token = rng.choices(('digit', 'word', 'letter'), weights)[0]
+        if token == 'digit':
+            line.append(rng.randint(49, 57))
+        elif token == 'word':
+            line += rng.choice(words)
+        else:
+            line.append(rng.randint(97, 122))
+    if not any(48 <= byte <= 57 for byte in line):
+        line[rng.randrange(len(line))] = rng.randint(49, 57)
+    return bytes(line)
+
+
+def generate_input(output_file, size_bytes, source_file='input.txt', seed=2023):
+    """Write a synthetic input of at most size_bytes, streaming it out in blocks
+
+    A pool of distinct lines is generated once and sampled from, so inputs of
+    tens of GB are written at disk speed.
+
+    :return: Number of lines written
+    """
+    rng = random.Random(seed)
+    profile = profile_input(source_file)
+    pool = [synthetic_line(profile, rng) for _ in range(SYNTHETIC_POOL_SIZE)]
+    average_length = sum(len(line) + 1 for line in pool) / len(pool)
+    block_lines = max(1, int(1024 * 1024 / average_length))
+
+    written = 0
+    lines = 0
+    with open(output_file, 'wb') as file:
+        while written < size_bytes:
+            block = b'\n'.join(rng.choices(pool, k=block_lines)) + b'\n'
+            # Only whole lines are written, so stop once the next one would not fit
+            end = block.rfind(b'\n', 0, size_bytes - written)
+            if end == -1:
+                break
+            block = block[:end + 1]
+            file.write(block)
+            written += len(block)
+            lines += block.count(b'\n')
+    return lines
+
+
+def count_lines(input_file):
+    lines = 0
+    last = b'\n'
+    with open(input_file, 'rb') as file:
+        for chunk in iter(lambda: file.read(day1.CHUNK_SIZE), b''):
+            lines += chunk.count(b'\n')
+            last = chunk[-1:]
+    return lines + (last != b'\n')
+
+
+def measure_mode(mode, input_file, trace_allocations, connection):
+    # Runs in a fresh child process, so the peak RSS belongs to this mode alone
+    try:
+        day1.clients['s3'] = LocalS3({BENCH_BUCKET: {BENCH_KEY: LocalFile(input_file)}})
+        if trace_allocations:
+            tracemalloc.start()
+        blocks_before = sys.getallocatedblocks()
+        start = time.perf_counter()
+        if mode == 'legacy':
+            with open(input_file, 'r') as file:
+                total_sum = legacy_calibration_sum(file)
+        else:
+            part = 2 if mode == 'part2' else 1
+            total_sum = day1.read_calibration_sum(BENCH_BUCKET, BENCH_KEY, 'stream', part)
+        elapsed = time.perf_counter() - start
+        result = {
+            'sum': total_sum,
+            'seconds': elapsed,
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            # Net change in live allocator blocks, not the number of allocations made
+            'live_blocks_delta': sys.getallocatedblocks() - blocks_before,
+        }
+        if trace_allocations:
+            result['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        connection.send(('ok', result))
+    except Exception as e:
+        connection.send(('error', f"{type(e).__name__}: {str(e)}"))
+    finally:
+        connection.close()
+
+
+def run_mode(mode, input_file, trace_allocations=False):
+    parent_connection, child_connection = Pipe(duplex=False)
+    worker = Process(target=measure_mode, args=(mode, input_file, trace_allocations, child_connection))
+    worker.start()
+    child_connection.close()
+    status, result = parent_connection.recv()
+    worker.join()
+    if status != 'ok':
+        raise RuntimeError(f"Benchmark mode {mode} failed: {result}")
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(input_file, modes=MODES, trace_allocations=False):
+    """Run each mode over input_file and collect throughput and memory figures"""
+    size = os.path.getsize(input_file)
+    lines = count_lines(input_file)
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'input': {'path': input_file, 'bytes': size, 'lines': lines},
+        'results': {},
+    }
+    for mode in modes:
+        result = run_mode(mode, input_file, trace_allocations)
+        result['lines_per_second'] = lines / result['seconds'] if result['seconds'] else None
+        result['mb_per_second'] = size / 1e6 / result['seconds'] if result['seconds'] else None
+        report['results'][mode] = result
+        print(f"{mode:>7}: {result['seconds']:.2f}s, {result['lines_per_second']:,.0f} lines/s, "
+              f"{result['mb_per_second']:.1f} MB/s, peak RSS {result['peak_rss_mb']:.1f} MB, sum={result['sum']}")
+    return report
+
+
+def compare_reports(baseline, report):
+    print(f"Compared with {baseline.get('commit') or 'baseline'}:")
+    for mode, result in report['results'].items():
+        previous = baseline.get('results', {}).get(mode)
+        if not previous or not previous.get('mb_per_second'):
+            continue
+        change = (result['mb_per_second'] / previous['mb_per_second'] - 1) * 100
+        print(f"{mode:>7}: {previous['mb_per_second']:.1f} -> {result['mb_per_second']:.1f} MB/s ({change:+.1f}%), "
+              f"peak RSS {previous['peak_rss_mb']:.1f} -> {result['peak_rss_mb']:.1f} MB")
+
+
+def scale_command(args):
+    with open(args.input_file, 'rb') as file:
+        data = file.read()
+    size_mb = len(data) * args.scale / 1e6
+    print(f"Input: {args.input_file} x {args.scale} ({size_mb:.1f} MB)")
+
+    legacy_sum, legacy_time = timed(legacy_calibration_sum, repeated_lines(data, args.scale))
+    print(f"legacy list comprehension: {legacy_time:.2f}s ({size_mb / legacy_time:.1f} MB/s) sum={legacy_sum}")
+
+    bytes_sum, bytes_time = timed(stream_calibration_sum, RepeatedBody(data, args.scale))
+    print(f"bytes.translate extractor: {bytes_time:.2f}s ({size_mb / bytes_time:.1f} MB/s) sum={bytes_sum}")
+
+    if legacy_sum != bytes_sum:
+        raise SystemExit("Extractors disagree on the sum")
+    print(f"Speed-up: {legacy_time / bytes_time:.1f}x")
+
+
+def generate_command(args):
+    start = time.perf_counter()
+    lines = generate_input(args.output_file, args.size, args.source, args.seed)
+    print(f"Wrote {lines} lines ({os.path.getsize(args.output_file) / 1e6:.1f} MB) to {args.output_file} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+def run_command(args):
+    modes = args.modes.split(',')
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        raise SystemExit(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+    input_file = args.input
+    generated = None
+    if input_file is None:
+        generated = tempfile.NamedTemporaryFile(suffix='.txt', delete=False)
+        generated.close()
+        input_file = generated.name
+        lines = generate_input(input_file, args.size, args.source, args.seed)
+        print(f"Generated {lines} synthetic lines ({args.size / 1e6:.1f} MB)")
+    try:
+        report = run_benchmarks(input_file, modes, args.trace_allocations)
+    finally:
+        if generated:
+            os.remove(generated.name)
+    if generated:
+        report['input'].update({'path': None, 'synthetic': True, 'seed': args.seed})
+
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Saved results to {args.output}")
+    if args.compare:
+        with open(args.compare) as file:
+            compare_reports(json.load(file), report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the calibration pipeline")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scale = commands.add_parser('scale', help="Compare the digit extractors on a scaled-up input")
+    scale.add_argument('input_file', nargs='?', default='input.txt')
+    scale.add_argument('--scale', type=int, default=10 ** 4, help="Number of copies of the input to process")
+    scale.set_defaults(handler=scale_command)
+
+    generate = commands.add_parser('generate', help="Write a synthetic input shaped like input.txt")
+    generate.add_argument('output_file')
+    generate.add_argument('--size', type=parse_size, default='64MB', help="Approximate size, e.g. 512MB or 20GB")
+    generate.add_argument('--source', default='input.txt', help="Real input whose distribution is copied")
+    generate.add_argument('--seed', type=int, default=2023)
+    generate.set_defaults(handler=generate_command)
+
+    run = commands.add_parser('run', help="Time each mode through the handler's compute path and save the results")
+    run.add_argument('--input', help="Input file to use instead of generating one")
+    run.add_argument('--size', type=parse_size, default='64MB', help="Size of the generated input")
+    run.add_argument('--source', default='input.txt', help="Real input whose distribution is copied")
+    run.add_argument('--seed', type=int, default=2023)
+    run.add_argument('--modes', default=','.join(MODES), help="Comma-separated subset of: " + ', '.join(MODES))
+    run.add_argument('--trace-allocations', action='store_true', help="Also record the tracemalloc peak (slow)")
+    run.add_argument('--output', default='benchmark_results.json', help="Where to write the JSON results")
+    run.add_argument('--compare', help="Earlier JSON results to compare against")
+    run.set_defaults(handler=run_command)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+# Cumulative time `import day1` may take, measured with -X importtime
+IMPORT_TIME_BUDGET_MS = 100
+# Modules the compute path must not pull in at import time
+FORBIDDEN_MODULES = ('boto3', 'botocore', 'multiprocessing', 'concurrent.futures', 'pyarrow')
+
+
+def measure_import(module_name, runs=5):
+    """Import a module in fresh interpreters and report the fastest run
+
+    :param module_name: Module to import
+    :param runs: Number of interpreters to start, the minimum hides scheduling noise
+    :return: (cumulative import time in ms, set of every module imported along the way)
+    """
+    best = None
+    imported = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+            capture_output=True, text=True, check=True
+        )
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if not cumulative.strip().isdigit():
+                continue  # Header line
+            name = name.strip()
+            imported.add(name)
+            if name == module_name:
+                elapsed = int(cumulative) / 1000
+                best = elapsed if best is None else min(best, elapsed)
+    return best, imported
+
+
+def main():
+    elapsed, imported = measure_import('day1')
+    print(f"import day1: {elapsed:.1f} ms (budget {IMPORT_TIME_BUDGET_MS} ms)")
+
+    failures = []
+    if elapsed > IMPORT_TIME_BUDGET_MS:
+        failures.append(f"import day1 took {elapsed:.1f} ms, over the {IMPORT_TIME_BUDGET_MS} ms budget")
+    for name in sorted(imported):
+        if any(name == forbidden or name.startswith(forbidden + '.') for forbidden in FORBIDDEN_MODULES):
+            failures.append(f"import day1 pulled in {name}")
+
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,89 @@
 import boto3
+import functools
+import threading
+from botocore.config import Config
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from delete_athena_database import delete_athena_database
 
-def cleanup_resources():
-    # Initialize AWS clients
-    s3 = boto3.client('s3')
-    lambda_client = boto3.client('lambda')
-    iam = boto3.client('iam')
-    athena = boto3.client('athena')
-
-    # Delete S3 bucket
-    bucket_name = 'advent-of-code-day'
-    try:
-        # Check if bucket exists
-        s3.head_bucket(Bucket=bucket_name)
-        
-        # Empty the bucket first, including all versions and delete markers
-        paginator = s3.get_paginator('list_object_versions')
-        for page in paginator.paginate(Bucket=bucket_name):
+# Keys per delete_objects call, the most S3 accepts
+DELETE_BATCH_SIZE = 1000
+# delete_objects calls in flight while the bucket listing continues
+DELETE_CONCURRENCY = 16
+
+# boto3's default session is not safe for creating clients from several threads at once
+client_lock = threading.Lock()
+
+
+def make_client(service_name, **kwargs):
+    with client_lock:
+        return boto3.client(service_name, **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def get_account_id():
+    return make_client('sts').get_caller_identity()['Account']
+
+
+def empty_bucket(s3, bucket_name, concurrency=DELETE_CONCURRENCY):
+    """Delete every object version and delete marker in a bucket
+
+    Each listing page (up to 1,000 entries) becomes one delete_objects call
+    on a thread pool, so deletes run while the listing carries on.
+
+    :return: Number of versions and delete markers deleted
+    """
+    deleted = 0
+    errors = []
+    in_flight = set()
+
+    def collect(done):
+        nonlocal deleted
+        for future in done:
+            in_flight.discard(future)
+            count, batch_errors = future.result()
+            deleted += count
+            errors.extend(batch_errors)
+
+    def delete_batch(objects):
+        response = s3.delete_objects(Bucket=bucket_name, Delete={'Objects': objects, 'Quiet': True})
+        batch_errors = response.get('Errors', [])
+        return len(objects) - len(batch_errors), batch_errors
+
+    paginator = s3.get_paginator('list_object_versions')
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for page in paginator.paginate(Bucket=bucket_name, PaginationConfig={'PageSize': DELETE_BATCH_SIZE}):
             objects_to_delete = []
             for version in page.get('Versions', []):
                 objects_to_delete.append({'Key': version['Key'], 'VersionId': version['VersionId']})
             for marker in page.get('DeleteMarkers', []):
                 objects_to_delete.append({'Key': marker['Key'], 'VersionId': marker['VersionId']})
-            
-            if objects_to_delete:
-                s3.delete_objects(Bucket=bucket_name, Delete={'Objects': objects_to_delete})
-        
+
+            for start in range(0, len(objects_to_delete), DELETE_BATCH_SIZE):
+                # Keep the listing from running too far ahead of the deletes
+                if len(in_flight) >= 2 * concurrency:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(executor.submit(delete_batch, objects_to_delete[start:start + DELETE_BATCH_SIZE]))
+        collect(list(in_flight))
+
+    for error in errors[:10]:
+        print(f"Could not delete {error['Key']} ({error.get('VersionId')}): {error['Code']} {error['Message']}")
+    if errors:
+        print(f"{len(errors)} objects could not be deleted from {bucket_name}")
+    return deleted
+
+
+def delete_s3_bucket(bucket_name):
+    # One pooled connection per concurrent delete_objects call
+    s3 = make_client('s3', config=Config(max_pool_connections=DELETE_CONCURRENCY))
+    try:
+        # Check if bucket exists
+        s3.head_bucket(Bucket=bucket_name)
+
+        # Empty the bucket first, including all versions and delete markers
+        deleted = empty_bucket(s3, bucket_name)
+        print(f"Deleted {deleted} object versions from {bucket_name}")
+
         # Now delete the empty bucket
         s3.delete_bucket(Bucket=bucket_name)
         print(f"Deleted S3 bucket: {bucket_name}")
@@ -36,8 +94,9 @@ def cleanup_resources():
     except Exception as e:
         print(f"Error deleting S3 bucket: {str(e)}")
 
-    # Delete Lambda function
-    function_name = 'advent_of_code_day1'
+
+def delete_lambda_function(function_name):
+    lambda_client = make_client('lambda')
     try:
         lambda_client.delete_function(FunctionName=function_name)
         print(f"Deleted Lambda function: {function_name}")
@@ -46,8 +105,9 @@ def cleanup_resources():
     except Exception as e:
         print(f"Error deleting Lambda function: {str(e)}")
 
-    # Delete IAM role
-    role_name = 'lambda_exec_role'
+
+def delete_iam_role(role_name):
+    iam = make_client('iam')
     try:
         # Remove instance profiles
         instance_profiles = iam.list_instance_profiles_for_role(RoleName=role_name)
@@ -80,28 +140,31 @@ def cleanup_resources():
     except Exception as e:
         print(f"Error deleting IAM role: {str(e)}")
 
-    # Delete IAM policy
-    policy_name = 'lambda_exec_role'
+
+def delete_iam_policy(policy_name):
+    iam = make_client('iam')
     try:
+        policy_arn = f"arn:aws:iam::{get_account_id()}:policy/{policy_name}"
+
         # List all versions of the policy
-        versions = iam.list_policy_versions(PolicyArn=f"arn:aws:iam::{boto3.client('sts').get_caller_identity()['Account']}:policy/{policy_name}")
-        
+        versions = iam.list_policy_versions(PolicyArn=policy_arn)
+
         # Delete all non-default versions
         for version in versions['Versions']:
             if not version['IsDefaultVersion']:
-                iam.delete_policy_version(PolicyArn=f"arn:aws:iam::{boto3.client('sts').get_caller_identity()['Account']}:policy/{policy_name}", 
-                                          VersionId=version['VersionId'])
-        
+                iam.delete_policy_version(PolicyArn=policy_arn, VersionId=version['VersionId'])
+
         # Delete the policy
-        iam.delete_policy(PolicyArn=f"arn:aws:iam::{boto3.client('sts').get_caller_identity()['Account']}:policy/{policy_name}")
+        iam.delete_policy(PolicyArn=policy_arn)
         print(f"Deleted IAM policy: {policy_name}")
     except iam.exceptions.NoSuchEntityException:
         print(f"IAM policy {policy_name} does not exist. Skipping.")
     except Exception as e:
         print(f"Error deleting IAM policy: {str(e)}")
 
-    # Delete Athena workgroup
-    workgroup_name = 'advent_workgroup'
+
+def delete_athena_workgroup(workgroup_name):
+    athena = make_client('athena')
     try:
         # Check if the workgroup exists
         athena.get_work_group(WorkGroup=workgroup_name)
@@ -113,12 +176,58 @@ def cleanup_resources():
     except Exception as e:
         print(f"Error deleting Athena workgroup: {str(e)}")
 
-    # Delete Athena database
-    database_name = 'advent_database'
-    if delete_athena_database(database_name):
+
+def delete_database(database_name):
+    if delete_athena_database(database_name, make_client('athena')):
         print(f"Athena database '{database_name}' deleted successfully.")
     else:
         print(f"Failed to delete Athena database '{database_name}'.")
 
+
+def teardown_plan():
+    """Resources to delete, as name -> (delete function, argument, names it must wait for)
+
+    The role goes after the function that uses it, and the policy after the
+    role it may be attached to. Everything else is independent.
+    """
+    return {
+        's3_bucket': (delete_s3_bucket, 'advent-of-code-day', ()),
+        'lambda_function': (delete_lambda_function, 'advent_of_code_day1', ()),
+        'iam_role': (delete_iam_role, 'lambda_exec_role', ('lambda_function',)),
+        'iam_policy': (delete_iam_policy, 'lambda_exec_role', ('iam_role',)),
+        'athena_workgroup': (delete_athena_workgroup, 'advent_workgroup', ()),
+        'athena_database': (delete_database, 'advent_database', ()),
+    }
+
+
+def run_teardown(plan, max_workers=None):
+    """Run every deletion in the plan as soon as the ones it depends on have finished
+
+    A failed deletion still releases its dependents, matching the one-by-one
+    behaviour where every step was attempted.
+    """
+    finished = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(plan)) as executor:
+        while len(finished) < len(plan):
+            for name, (delete, argument, dependencies) in plan.items():
+                if name not in finished and name not in running.values() and set(dependencies) <= finished:
+                    running[executor.submit(delete, argument)] = name
+            if not running:
+                missing = sorted(set(plan) - finished)
+                raise ValueError(f"Teardown plan has unmet or circular dependencies: {', '.join(missing)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error during {name} teardown: {str(e)}")
+                finished.add(name)
+
+
+def cleanup_resources():
+    run_teardown(teardown_plan())
+
 if __name__ == "__main__":
-    cleanup_resources()
\ No newline at end of file
+    cleanup_resources()
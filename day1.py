@@ -1,94 +1,1271 @@
-import boto3
 import os
+import sys
+import json
+import base64
+import functools
+import contextlib
+import threading
+import hashlib
+import time
 import logging
-from botocore.exceptions import ClientError
+import resource
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from urllib.parse import quote
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-s3 = boto3.client('s3')
+# AWS clients by service name, created on first use so the compute path
+# (and local runs) never pay for importing boto3
+clients = {}
+
+# Size of each read from the S3 streaming body
+CHUNK_SIZE = 1024 * 1024
+# Sharded mode does not split objects into ranges smaller than this
+MIN_SHARD_SIZE = 8 * 1024 * 1024
+# Fan-out mode hands each worker invocation a byte range of this size
+FAN_OUT_SHARD_SIZE = 256 * 1024 * 1024
+# Seconds a fan-out attempt waits for its shards when the remaining invocation time is unknown,
+# chosen so that every attempt fits the 900 s function timeout
+FAN_OUT_SHARD_TIMEOUT = 240
+# Seconds of the invocation kept back for reading the partials and writing the output
+FAN_OUT_REDUCE_RESERVE = 30
+# Fan-out workers write their partial sums under this prefix
+PARTIALS_PREFIX = 'partials/'
+# Per-line results are written as Parquet under this prefix, see CalibrationLineWriter
+LINES_PREFIX = 'calibration_lines/'
+# Rows per Parquet file of per-line results
+LINES_PER_FILE = 1000000
+# Batch mode reads this many objects at once over one shared client
+BATCH_WORKERS = 32
+# Incremental mode checks this many bytes before the checkpoint offset
+CHECKPOINT_TAIL_LENGTH = 4096
+# CloudWatch namespace of the per-invocation metrics record
+METRICS_NAMESPACE = 'AdventOfCode/Day1'
+# Number of results kept in the warm-container cache
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 128))
+
+# Warm-container cache of cache key -> sum, least recently used first
+result_cache = OrderedDict()
+
+
+# Every byte except the ASCII digits and the newline, removed by bytes.translate
+NON_DIGIT_BYTES = bytes(b for b in range(256) if b != ord('\n') and not ord('0') <= b <= ord('9'))
+
+
+# Spelled-out digits that also count as digits in part two
+DIGIT_WORDS = {
+    b'one': 1, b'two': 2, b'three': 3, b'four': 4, b'five': 5,
+    b'six': 6, b'seven': 7, b'eight': 8, b'nine': 9,
+}
+
+
+def build_digit_automaton(patterns):
+    """Compile patterns into a dense Aho-Corasick automaton
+
+    :param patterns: Dict mapping byte patterns to the digit they stand for
+    :return: (transitions, outputs) where transitions is a flat list indexed by
+        state * 256 + byte and outputs[state] is the digit matched on entering
+        that state, or -1 if no pattern ends there
+    """
+    # Build the trie of all patterns
+    goto = [{}]
+    outputs = [-1]
+    for pattern, value in patterns.items():
+        state = 0
+        for byte in pattern:
+            if byte not in goto[state]:
+                goto.append({})
+                outputs.append(-1)
+                goto[state][byte] = len(goto) - 1
+            state = goto[state][byte]
+        outputs[state] = value
+
+    # Fold the failure links into a full transition table, breadth first so a
+    # state's failure target is always finished before the state itself
+    transitions = [0] * (len(goto) * 256)
+    failure = [0] * len(goto)
+    queue = deque()
+    for byte in range(256):
+        next_state = goto[0].get(byte, 0)
+        transitions[byte] = next_state
+        if next_state:
+            queue.append(next_state)
+    while queue:
+        state = queue.popleft()
+        if outputs[state] < 0:
+            outputs[state] = outputs[failure[state]]
+        for byte in range(256):
+            fallback = transitions[failure[state] * 256 + byte]
+            next_state = goto[state].get(byte)
+            if next_state is None:
+                transitions[state * 256 + byte] = fallback
+            else:
+                failure[next_state] = fallback
+                transitions[state * 256 + byte] = next_state
+                queue.append(next_state)
+    return transitions, outputs
+
+
+def first_match(data, automaton):
+    # Run the automaton until the first pattern ends, so the scan stops early
+    transitions, outputs = automaton
+    state = 0
+    for byte in data:
+        state = transitions[state * 256 + byte]
+        if outputs[state] >= 0:
+            return outputs[state]
+    return -1
+
+
+DIGIT_PATTERNS = {str(digit).encode(): digit for digit in range(10)}
+DIGIT_PATTERNS.update(DIGIT_WORDS)
+
+
+@functools.lru_cache(maxsize=None)
+def digit_automata():
+    # Built on first use rather than at import, as it is only needed for part two.
+    # One automaton reads lines left to right, the other reads them right to left
+    # against the reversed patterns, so "twone" gives 2 from the front and 1 from the back
+    forward = build_digit_automaton(DIGIT_PATTERNS)
+    backward = build_digit_automaton({pattern[::-1]: digit for pattern, digit in DIGIT_PATTERNS.items()})
+    return forward, backward
+
+
+def spelled_calibration_sum(buffer):
+    """Sum the part two calibration values of a buffer of whole lines
+
+    Both numeric and spelled-out digits count. Each line is scanned once from
+    the front and once from the back, stopping at the first match either way.
+    """
+    forward, backward = digit_automata()
+    total_sum = 0
+    for line in buffer.split(b'\n'):
+        first_digit = first_match(line, forward)
+        if first_digit >= 0:
+            total_sum += first_digit * 10 + first_match(reversed(line), backward)
+    return total_sum
+
+
+def calibration_sum(buffer, part=1):
+    """Sum the calibration values of a buffer of whole lines
+
+    In part two spelled-out digits count too, see spelled_calibration_sum.
+    Otherwise all non-digit bytes are stripped in one C-level translate call, which
+    leaves each line as just its digits, so the first and last digit are
+    read by index without creating a Python object per character.
+
+    :param buffer: Bytes holding one or more lines
+    :param part: Puzzle part, 1 for numeric digits only or 2 to include digit words
+    :return: Sum of the two-digit value of every line that contains a digit
+    """
+    if part == 2:
+        return spelled_calibration_sum(buffer)
+    total_sum = 0
+    for digits in buffer.translate(None, NON_DIGIT_BYTES).split(b'\n'):
+        if digits:  # Check if there are any digits in the line
+            total_sum += (digits[0] - 48) * 10 + digits[-1] - 48
+    return total_sum
+
+
+def iter_chunks(body, chunk_size=CHUNK_SIZE):
+    return iter(lambda: body.read(chunk_size), b'')
+
+
+def fold_chunks(chunks, part=1, score=calibration_sum):
+    """Fold an iterable of byte chunks into a running sum, line by line
+
+    Lines split across chunk boundaries are carried over to the next chunk,
+    so only one chunk plus one partial line is held in memory at a time.
+
+    :param score: Called as score(buffer, part) on each buffer of whole lines
+    :return: (sum of every complete line, trailing bytes after the last newline)
+    """
+    total_sum = 0
+    remainder = b''
+    for chunk in chunks:
+        buffer = remainder + chunk
+        # Everything after the last newline is kept for the next chunk
+        cut = buffer.rfind(b'\n') + 1
+        total_sum += score(buffer[:cut], part)
+        remainder = buffer[cut:]
+    return total_sum, remainder
+
+
+def stream_calibration_sum(body, chunk_size=CHUNK_SIZE, part=1, score=calibration_sum):
+    """Sum the calibration values of a streaming body without buffering it
+
+    :param body: File-like object with a read(size) method, e.g. get_object()['Body']
+    :param chunk_size: Number of bytes to read per call
+    :param part: Puzzle part, see calibration_sum
+    :param score: Scoring function, see fold_chunks
+    :return: Sum of the calibration values of every line
+    """
+    total_sum, remainder = fold_chunks(iter_chunks(body, chunk_size), part, score)
+    return total_sum + score(remainder, part)
+
+
+def line_digits(buffer, part=1):
+    """Yield (first digit, last digit) for each line of a buffer, or (None, None) without a digit"""
+    if not buffer:
+        return
+    if part == 2:
+        forward, backward = digit_automata()
+        lines = buffer.split(b'\n')
+    else:
+        lines = buffer.translate(None, NON_DIGIT_BYTES).split(b'\n')
+    # A buffer ending in a newline has no line after it
+    if buffer.endswith(b'\n'):
+        lines.pop()
+    for line in lines:
+        if part == 2:
+            first_digit = first_match(line, forward)
+            if first_digit < 0:
+                yield None, None
+            else:
+                yield first_digit, first_match(reversed(line), backward)
+        elif line:
+            yield line[0] - 48, line[-1] - 48
+        else:
+            yield None, None
+
+
+class CalibrationLineWriter:
+    """Records every line's digits and writes them as Snappy-compressed Parquet
+
+    Pass writer.score to stream_calibration_sum in place of calibration_sum.
+    Files go to LINES_PREFIX/source=<key>/run_date=<date>/part<n>-<seq>.parquet,
+    the layout the calibration_lines Athena table is partitioned by. close()
+    removes this part's files from earlier runs of the source, both from
+    earlier days and from a longer run of the same day, so the table holds
+    one copy of each line. Needs pyarrow, which is imported only when a
+    writer is made.
+    """
+
+    def __init__(self, client, bucket_name, source_key, part=1, run_date=None, rows_per_file=LINES_PER_FILE):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Writing per-line results needs pyarrow, add it to the deployment package or a layer")
+        self.pyarrow = pyarrow
+        self.client = client
+        self.bucket_name = bucket_name
+        self.part = part
+        self.rows_per_file = rows_per_file
+        run_date = run_date or datetime.now(timezone.utc).date().isoformat()
+        # Keys may contain slashes, which would nest the partition directories
+        self.source_prefix = f"{LINES_PREFIX}source={quote(source_key, safe='')}/"
+        self.prefix = f"{self.source_prefix}run_date={run_date}/"
+        self.line_number = 0
+        self.keys = []
+        self._reset()
+
+    def _reset(self):
+        self.columns = {'line_number': [], 'first_digit': [], 'last_digit': [], 'value': []}
+
+    def score(self, buffer, part):
+        total_sum = 0
+        columns = self.columns
+        for first_digit, last_digit in line_digits(buffer, part):
+            self.line_number += 1
+            value = None if first_digit is None else first_digit * 10 + last_digit
+            columns['line_number'].append(self.line_number)
+            columns['first_digit'].append(first_digit)
+            columns['last_digit'].append(last_digit)
+            columns['value'].append(value)
+            if value is not None:
+                total_sum += value
+        if len(columns['line_number']) >= self.rows_per_file:
+            self.flush()
+        return total_sum
+
+    def flush(self):
+        if not self.columns['line_number']:
+            return
+        pa = self.pyarrow
+        table = pa.table({
+            'line_number': pa.array(self.columns['line_number'], pa.int64()),
+            'first_digit': pa.array(self.columns['first_digit'], pa.int8()),
+            'last_digit': pa.array(self.columns['last_digit'], pa.int8()),
+            'value': pa.array(self.columns['value'], pa.int32()),
+            'part': pa.array([self.part] * len(self.columns['line_number']), pa.int8()),
+        })
+        sink = pa.BufferOutputStream()
+        pa.parquet.write_table(table, sink, compression='snappy')
+        key = f"{self.prefix}part{self.part}-{len(self.keys):05d}.parquet"
+        self.client.put_object(Bucket=self.bucket_name, Key=key, Body=sink.getvalue().to_pybytes())
+        self.keys.append(key)
+        logger.info(f"Wrote {table.num_rows} line results to {key}")
+        self._reset()
+
+    def close(self):
+        self.flush()
+        written = set(self.keys)
+        stale = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.source_prefix):
+            stale.extend(
+                {'Key': item['Key']} for item in page.get('Contents', [])
+                if item['Key'] not in written and item['Key'].rsplit('/', 1)[-1].startswith(f"part{self.part}-")
+            )
+        for start in range(0, len(stale), 1000):
+            self.client.delete_objects(Bucket=self.bucket_name, Delete={'Objects': stale[start:start + 1000]})
+
+
+def plan_shards(object_size, shard_count):
+    # Split [0, object_size) into shard_count contiguous byte ranges
+    shard_size = -(-object_size // shard_count)
+    return [(start, min(start + shard_size, object_size)) for start in range(0, object_size, shard_size)]
+
+
+def skip_partial_line(chunks):
+    # Drop everything up to and including the first newline
+    for chunk in chunks:
+        newline = chunk.find(b'\n')
+        if newline >= 0:
+            yield chunk[newline + 1:]
+            break
+    yield from chunks
+
+
+def read_line_rest(client, bucket_name, input_key, offset, object_size):
+    # Fetch bytes from offset up to the next newline, doubling the range each time
+    rest = b''
+    length = 4096
+    while offset < object_size:
+        end = min(offset + length, object_size)
+        chunk = client.get_object(Bucket=bucket_name, Key=input_key, Range=f'bytes={offset}-{end - 1}')['Body'].read()
+        newline = chunk.find(b'\n')
+        if newline >= 0:
+            return rest + chunk[:newline]
+        rest += chunk
+        offset = end
+        length *= 2
+    return rest
+
+
+def shard_calibration_sum(client, bucket_name, input_key, start, end, object_size, part=1):
+    """Sum the lines that start inside the byte range [start, end)
+
+    The range is fetched from one byte early so a line starting exactly at
+    `start` can be told apart from one that began in the previous shard, which
+    is skipped. The last line is completed past `end` with a small extra read.
+    """
+    fetch_start = max(start - 1, 0)
+    response = client.get_object(Bucket=bucket_name, Key=input_key, Range=f'bytes={fetch_start}-{end - 1}')
+    chunks = iter_chunks(response['Body'])
+    if start > 0:
+        chunks = skip_partial_line(chunks)
+    total_sum, remainder = fold_chunks(chunks, part)
+    if remainder:
+        remainder += read_line_rest(client, bucket_name, input_key, end, object_size)
+        total_sum += calibration_sum(remainder, part)
+    return total_sum
+
+
+def get_client(service_name):
+    if service_name not in clients:
+        import boto3
+        clients[service_name] = boto3.client(service_name)
+    return clients[service_name]
+
+
+def make_s3_client(max_pool_connections=10):
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client('s3', config=Config(max_pool_connections=max_pool_connections))
+
+
+def shard_worker(connection, bucket_name, input_key, shards, object_size, part, connections):
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Runs in a child process: one client per process, one thread per open connection
+    try:
+        client = make_s3_client(connections)
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            sums = executor.map(
+                lambda shard: shard_calibration_sum(client, bucket_name, input_key, shard[0], shard[1], object_size, part),
+                shards
+            )
+            connection.send(('ok', sum(sums)))
+    except Exception as e:
+        connection.send(('error', f"{type(e).__name__}: {str(e)}"))
+    finally:
+        connection.close()
+
+
+def sharded_calibration_sum(bucket_name, input_key, part=1, processes=None, connections=4, min_shard_size=MIN_SHARD_SIZE):
+    """Sum the object with ranged GETs spread over a pool of processes
+
+    multiprocessing.Pool needs /dev/shm, which Lambda does not provide, so
+    each worker is a plain Process that reports its partial sum over a Pipe.
+
+    :param processes: Number of worker processes, defaults to the CPU count
+    :param connections: Concurrent ranged GETs per worker process
+    :param min_shard_size: Smallest byte range worth its own request
+    """
+    from multiprocessing import Pipe, Process
+
+    s3 = get_client('s3')
+    object_size = s3.head_object(Bucket=bucket_name, Key=input_key)['ContentLength']
+    if object_size == 0:
+        return 0
+    processes = processes or os.cpu_count() or 1
+    shard_count = max(1, min(processes * connections, -(-object_size // min_shard_size)))
+    if shard_count == 1:
+        return shard_calibration_sum(s3, bucket_name, input_key, 0, object_size, object_size, part)
+
+    shards = plan_shards(object_size, shard_count)
+    processes = min(processes, len(shards))
+    logger.info(f"Splitting {input_key} ({object_size} bytes) into {len(shards)} shards over {processes} processes")
+
+    workers = []
+    for index in range(processes):
+        parent_connection, child_connection = Pipe(duplex=False)
+        worker = Process(
+            target=shard_worker,
+            args=(child_connection, bucket_name, input_key, shards[index::processes], object_size, part, connections)
+        )
+        worker.start()
+        child_connection.close()
+        workers.append((worker, parent_connection))
+
+    total_sum = 0
+    errors = []
+    for worker, connection in workers:
+        try:
+            status, result = connection.recv()
+        except EOFError:
+            status, result = 'error', f"worker exited with code {worker.exitcode}"
+        worker.join()
+        if status == 'ok':
+            total_sum += result
+        else:
+            errors.append(result)
+    if errors:
+        raise RuntimeError(f"{len(errors)} shard worker(s) failed: {'; '.join(errors)}")
+    return total_sum
+
+
+def partial_key(run_id, start, end):
+    # Zero-padded so the keys of one run list in byte order
+    return f"{PARTIALS_PREFIX}{run_id}/{start:020d}-{end:020d}.json"
+
+
+def fan_out_run_id(head_response, part):
+    # Keyed on the input's ETag, so re-running on unchanged input reuses finished partials
+    etag = head_response['ETag'].strip('"')
+    return f"{etag}-part{part}"
+
+
+def shard_handler(event, context):
+    """Worker side of fan-out mode: sum one byte range and store the partial sum"""
+    s3 = get_client('s3')
+    bucket_name = event['bucket']
+    input_key = event['input_key']
+    start, end = event['start'], event['end']
+    total_sum = shard_calibration_sum(s3, bucket_name, input_key, start, end, event['object_size'], event['part'])
+    s3.put_object(
+        Bucket=bucket_name,
+        Key=event['partial_key'],
+        Body=json.dumps({'start': start, 'end': end, 'sum': total_sum}).encode('utf-8'),
+        ContentType='application/json'
+    )
+    logger.info(f"Wrote partial sum {total_sum} for bytes {start}-{end} to {event['partial_key']}")
+    return {'statusCode': 200, 'body': json.dumps({'partial_key': event['partial_key'], 'sum': total_sum})}
+
+
+def list_partial_keys(client, bucket_name, prefix):
+    keys = set()
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        keys.update(item['Key'] for item in page.get('Contents', []))
+    return keys
+
+
+def fan_out_attempt_wait(context, shard_timeout, attempts_left):
+    """Seconds to wait for shards so the remaining attempts and the reduce all fit the invocation"""
+    if context is None:
+        return FAN_OUT_SHARD_TIMEOUT if shard_timeout is None else shard_timeout
+    remaining = context.get_remaining_time_in_millis() / 1000 - FAN_OUT_REDUCE_RESERVE
+    wait = max(0, remaining / attempts_left)
+    return wait if shard_timeout is None else min(shard_timeout, wait)
+
+
+def fan_out_calibration_sum(bucket_name, input_key, part=1, function_name=None, lambda_client=None, s3_client=None,
+                            shard_size=FAN_OUT_SHARD_SIZE, shard_timeout=None, poll_interval=2, max_attempts=3,
+                            context=None):
+    """Split the object across many asynchronous invocations of the day1 function
+
+    Each worker gets one byte range and writes its partial sum to an
+    idempotent key under PARTIALS_PREFIX. Shards whose partial has not
+    appeared within the attempt's wait are invoked again, up to max_attempts
+    times, then the partials are read back and added up.
+
+    :param function_name: Worker function, defaults to the function running this code
+    :param lambda_client: Client used for the Invoke calls
+    :param s3_client: Client used to size the input and collect the partials
+    :param shard_timeout: Seconds each attempt waits, defaults to FAN_OUT_SHARD_TIMEOUT
+    :param context: Lambda context; the invocation's remaining time, less
+        FAN_OUT_REDUCE_RESERVE, is split between the attempts still left
+    :return: Sum of the calibration values of every line
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from botocore.exceptions import ClientError
+
+    s3_client = s3_client or get_client('s3')
+    lambda_client = lambda_client or get_client('lambda')
+    function_name = function_name or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'advent-of-code-2023-day1')
+
+    head = s3_client.head_object(Bucket=bucket_name, Key=input_key)
+    object_size = head['ContentLength']
+    if object_size == 0:
+        return 0
+    run_id = fan_out_run_id(head, part)
+    prefix = f"{PARTIALS_PREFIX}{run_id}/"
+    shards = {
+        partial_key(run_id, start, end): (start, end)
+        for start, end in plan_shards(object_size, -(-object_size // shard_size))
+    }
+    logger.info(f"Fanning {input_key} ({object_size} bytes) out to {len(shards)} invocations of {function_name}")
+
+    # Partials left by an earlier run over the same input are reused
+    pending = set(shards) - list_partial_keys(s3_client, bucket_name, prefix)
+    attempt = 0
+    while pending:
+        attempt += 1
+        if attempt > max_attempts:
+            raise RuntimeError(f"{len(pending)} shard(s) of {input_key} did not finish after {max_attempts} attempts")
+        if attempt > 1:
+            logger.warning(f"Retrying {len(pending)} shard(s), attempt {attempt} of {max_attempts}")
+
+        for key in sorted(pending):
+            start, end = shards[key]
+            payload = {
+                'action': 'shard', 'bucket': bucket_name, 'input_key': input_key, 'part': part,
+                'start': start, 'end': end, 'object_size': object_size, 'partial_key': key,
+            }
+            try:
+                lambda_client.invoke(FunctionName=function_name, InvocationType='Event', Payload=json.dumps(payload).encode('utf-8'))
+            except ClientError as e:
+                # Left pending, so the next attempt invokes it again
+                logger.error(f"Failed to invoke shard {start}-{end}: {str(e)}")
+
+        deadline = time.monotonic() + fan_out_attempt_wait(context, shard_timeout, max_attempts - attempt + 1)
+        while pending and time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            pending -= list_partial_keys(s3_client, bucket_name, prefix)
+
+    # Reduce the partial sums
+    def read_partial(key):
+        body = s3_client.get_object(Bucket=bucket_name, Key=key)['Body']
+        try:
+            return json.loads(body.read())['sum']
+        finally:
+            body.close()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        return sum(executor.map(read_partial, shards))
+
+
+def checkpoint_key(output_key):
+    # Stored next to the output, e.g. output.txt -> output.checkpoint.json
+    return f"{os.path.splitext(output_key)[0]}.checkpoint.json"
+
+
+def load_checkpoint(bucket_name, key):
+    from botocore.exceptions import ClientError
+
+    s3 = get_client('s3')
+    try:
+        body = s3.get_object(Bucket=bucket_name, Key=key)['Body']
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            return None
+        raise
+    try:
+        return json.loads(body.read())
+    finally:
+        body.close()
+
+
+def incremental_calibration_sum(bucket_name, input_key, output_key, part=1):
+    """Sum an append-only input, reading only the bytes added since the last run
+
+    The checkpoint records the offset just past the last complete line, the
+    sum of the lines before it and a hash of the CHECKPOINT_TAIL_LENGTH bytes
+    leading up to it. The next run fetches from the start of that tail, and
+    if the tail no longer matches (or the object shrank) it rescans from 0.
+    """
+    from botocore.exceptions import ClientError
+
+    s3 = get_client('s3')
+    key = checkpoint_key(output_key)
+    checkpoint = load_checkpoint(bucket_name, key)
+    if checkpoint and (checkpoint.get('input_key'), checkpoint.get('part')) != (input_key, part):
+        checkpoint = None
+
+    response = None
+    fetch_start = 0
+    total_sum = 0
+    history = b''
+    if checkpoint:
+        fetch_start = checkpoint['offset'] - checkpoint['tail_length']
+        try:
+            response = s3.get_object(Bucket=bucket_name, Key=input_key, Range=f'bytes={fetch_start}-')
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'InvalidRange':
+                raise
+            logger.warning(f"{input_key} is shorter than the checkpoint offset, rescanning")
+        if response:
+            history = response['Body'].read(checkpoint['tail_length'])
+            if hashlib.sha256(history).hexdigest() == checkpoint['tail_sha256']:
+                total_sum = checkpoint['total']
+                logger.info(f"Resuming {input_key} from byte {checkpoint['offset']}")
+            else:
+                logger.warning(f"{input_key} no longer matches the checkpoint, rescanning")
+                response['Body'].close()
+                response = None
+                history = b''
+
+    if response is None:
+        fetch_start = 0
+        response = s3.get_object(Bucket=bucket_name, Key=input_key)
+
+    # Keep the bytes just read, so the next tail can be hashed without another GET
+    window = [history]
+
+    def tracked(chunks):
+        for chunk in chunks:
+            window[0] = window[0][-CHECKPOINT_TAIL_LENGTH:] + chunk
+            yield chunk
+
+    body = response['Body']
+    try:
+        new_sum, remainder = fold_chunks(tracked(iter_chunks(body)), part)
+    finally:
+        body.close()
+
+    # Only complete lines go into the checkpoint, the unterminated last line
+    # is counted in this run's result and read again next time
+    total_sum += new_sum
+    offset = fetch_start + response['ContentLength'] - len(remainder)
+    if not checkpoint or offset != checkpoint['offset'] or total_sum != checkpoint['total']:
+        tail_length = min(offset, CHECKPOINT_TAIL_LENGTH)
+        window_end = len(window[0]) - len(remainder)
+        if window_end >= tail_length:
+            tail = window[0][window_end - tail_length:window_end]
+        else:
+            # The last line was longer than a chunk, fetch the tail instead
+            tail = s3.get_object(Bucket=bucket_name, Key=input_key, Range=f'bytes={offset - tail_length}-{offset - 1}')['Body'].read()
+        s3.put_object(
+            Bucket=bucket_name,
+            Key=key,
+            Body=json.dumps({
+                'input_key': input_key, 'part': part, 'offset': offset, 'total': total_sum,
+                'tail_length': tail_length, 'tail_sha256': hashlib.sha256(tail).hexdigest(),
+            }).encode('utf-8'),
+            ContentType='application/json'
+        )
+        logger.info(f"Checkpointed {input_key} at byte {offset}")
+    return total_sum + calibration_sum(remainder, part)
+
+
+def download_calibration_sum(bucket_name, input_key, part=1, metrics=None):
+    from botocore.exceptions import ClientError
+
+    s3 = get_client('s3')
+    metrics = metrics or Metrics()
+    # Download the file from S3
+    logger.debug(f"Attempting to download {input_key} from {bucket_name}")
+    try:
+        with metrics.phase('download'):
+            s3.download_file(bucket_name, input_key, '/tmp/input.txt')
+        logger.debug(f"Successfully downloaded {input_key}")
+    except ClientError as e:
+        logger.error(f"Failed to download {input_key}: {str(e)}")
+        raise
+
+    with open('/tmp/input.txt', 'rb') as file:
+        return stream_calibration_sum(metrics.reading(file, 'read'), part=part, score=metrics.parsing(calibration_sum))
+
+
+def read_calibration_sum(bucket_name, input_key, input_mode='stream', part=1, output_key='output.txt', line_writer=None,
+                         metrics=None, context=None, input_response=None):
+    from botocore.exceptions import ClientError
+
+    s3 = get_client('s3')
+    metrics = metrics or Metrics()
+    if line_writer and input_mode != 'stream':
+        raise ValueError(f"Per-line results need input mode 'stream', not '{input_mode}'")
+    if input_mode == 'download':
+        return download_calibration_sum(bucket_name, input_key, part, metrics)
+    if input_mode in ('sharded', 'incremental', 'fan_out'):
+        # These read in other processes or invocations, so they are timed as a whole
+        with metrics.phase('stream'):
+            return read_calibration_sum_elsewhere(bucket_name, input_key, input_mode, part, output_key, context)
+    if input_mode != 'stream':
+        raise ValueError(f"Unknown input mode: {input_mode}")
+
+    # Stream the object body straight into the running sum
+    logger.debug(f"Attempting to stream {input_key} from {bucket_name}")
+    try:
+        with metrics.phase('stream'):
+            response = input_response or s3.get_object(Bucket=bucket_name, Key=input_key)
+        logger.debug(f"Successfully opened {input_key} ({response.get('ContentLength')} bytes)")
+    except ClientError as e:
+        logger.error(f"Failed to read {input_key}: {str(e)}")
+        raise
+    body = metrics.reading(response['Body'])
+    try:
+        score = metrics.parsing(line_writer.score if line_writer else calibration_sum)
+        total_sum = stream_calibration_sum(body, part=part, score=score)
+        if line_writer:
+            with metrics.phase('upload'):
+                line_writer.close()
+        return total_sum
+    finally:
+        body.close()
+
+
+def read_calibration_sum_elsewhere(bucket_name, input_key, input_mode, part, output_key, context=None):
+    if input_mode == 'sharded':
+        return sharded_calibration_sum(
+            bucket_name, input_key, part,
+            processes=int(os.environ.get('SHARD_PROCESSES', 0)) or None,
+            connections=int(os.environ.get('SHARD_CONNECTIONS', 4))
+        )
+    if input_mode == 'incremental':
+        return incremental_calibration_sum(bucket_name, input_key, output_key, part)
+    if input_mode == 'fan_out':
+        return fan_out_calibration_sum(
+            bucket_name, input_key, part,
+            function_name=os.environ.get('FAN_OUT_FUNCTION'),
+            shard_size=int(os.environ.get('FAN_OUT_SHARD_SIZE', FAN_OUT_SHARD_SIZE)),
+            context=context
+        )
+    raise ValueError(f"Unknown input mode: {input_mode}")
+
+
+def object_calibration_sum(client, bucket_name, key, part=1):
+    body = client.get_object(Bucket=bucket_name, Key=key)['Body']
+    try:
+        return stream_calibration_sum(body, part=part)
+    finally:
+        body.close()
+
+
+def batch_calibration_sums(bucket_name, prefix, part=1, max_workers=BATCH_WORKERS, client=None, exclude=()):
+    """Sum every object under a prefix concurrently
+
+    Keys are listed page by page and handed to a bounded thread pool that
+    shares one client, so no more than twice max_workers objects are queued.
+
+    :param exclude: Keys to leave out, such as the batch's own outputs
+    :return: List of (key, sum or None, error message or None) in completion order
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    client = client or make_s3_client(max_workers)
+    results = []
+
+    def collect(done):
+        for future in done:
+            key = in_flight.pop(future)
+            try:
+                results.append((key, future.result(), None))
+            except Exception as e:
+                logger.error(f"Failed to process {key}: {str(e)}")
+                results.append((key, None, str(e)))
+
+    in_flight = {}
+    paginator = client.get_paginator('list_objects_v2')
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for item in page.get('Contents', []):
+                key = item['Key']
+                if key.endswith('/') or key in exclude or key.startswith(PARTIALS_PREFIX):
+                    continue
+                if len(in_flight) >= 2 * max_workers:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[executor.submit(object_calibration_sum, client, bucket_name, key, part)] = key
+        collect(list(in_flight))
+    return results
+
+
+def batch_handler(event, context):
+    """Score every object under event['prefix'] in one invocation
+
+    Per-object results are written as JSON lines to results_key and their
+    total to output_key.
+    """
+    bucket_name = event.get('bucket', 'advent-of-code-day')
+    prefix = event.get('prefix', 'inputs/')
+    part = int(event.get('part', os.environ.get('CALIBRATION_PART', 1)))
+    output_key = event.get('output_key', 'batch_output.txt')
+    results_key = event.get('results_key', 'batch_results.jsonl')
+    max_workers = int(event.get('max_workers', os.environ.get('BATCH_WORKERS', BATCH_WORKERS)))
+
+    client = make_s3_client(max_workers)
+    results = batch_calibration_sums(bucket_name, prefix, part, max_workers, client, exclude={output_key, results_key})
+    results.sort()
+    total_sum = sum(total for _, total, _ in results if total is not None)
+    failed = [key for key, _, error in results if error is not None]
+    logger.info(f"Processed {len(results)} objects under {prefix}, {len(failed)} failed, total {total_sum}")
+
+    lines = (json.dumps({'key': key, 'part': part, 'sum': total, 'error': error}) for key, total, error in results)
+    client.put_object(Bucket=bucket_name, Key=results_key, Body=''.join(line + '\n' for line in lines).encode('utf-8'))
+    client.put_object(Bucket=bucket_name, Key=output_key, Body=str(total_sum).encode('utf-8'))
+
+    if failed:
+        return {
+            'statusCode': 500,
+            'body': f"{len(failed)} of {len(results)} objects failed, see {results_key}"
+        }
+    return {
+        'statusCode': 200,
+        'body': f"Processed {len(results)} objects, total {total_sum}"
+    }
+
+
+class Metrics:
+    """Phase timers and counters for one invocation, emitted as a single record
+
+    The record is printed in CloudWatch Embedded Metric Format, which Lambda
+    turns into metrics without any PutMetricData calls.
+    """
+
+    def __init__(self, dimensions=None, namespace=METRICS_NAMESPACE):
+        self.namespace = namespace
+        self.dimensions = dict(dimensions or {})
+        self.timings = {}
+        self.counters = {}
+        self.properties = {}
+        self.peak_memory_reset = False
+
+    def reset_peak_memory(self):
+        """Start measuring peak memory from now rather than from container start
+
+        Writing 5 to /proc/self/clear_refs resets the VmHWM high-water mark
+        (Linux 4.0 and later). Where that is not allowed, record() falls back
+        to ru_maxrss and labels it ContainerPeakMemory.
+        """
+        try:
+            with open('/proc/self/clear_refs', 'w') as file:
+                file.write('5')
+            self.peak_memory_reset = True
+        except OSError:
+            self.peak_memory_reset = False
+
+    def peak_memory(self):
+        # (metric name, megabytes)
+        if self.peak_memory_reset:
+            try:
+                with open('/proc/self/status') as file:
+                    for line in file:
+                        if line.startswith('VmHWM:'):
+                            # Reported in kilobytes
+                            return 'PeakMemory', int(line.split()[1]) / 1024
+            except OSError:
+                pass
+        # ru_maxrss is in kilobytes on Linux and covers the container's lifetime
+        return 'ContainerPeakMemory', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def reading(self, body, phase='stream'):
+        """Wrap a body so reads are timed under phase and their bytes counted"""
+        return MeteredBody(body, self, phase)
+
+    def parsing(self, score):
+        """Wrap a scoring function so it is timed under 'parse' and its lines counted"""
+        def metered_score(buffer, part):
+            start = time.perf_counter()
+            result = score(buffer, part)
+            self.add_time('parse', time.perf_counter() - start)
+            self.count('Lines', buffer.count(b'\n') + (bool(buffer) and not buffer.endswith(b'\n')))
+            return result
+        return metered_score
+
+    def record(self):
+        memory_name, peak_memory = self.peak_memory()
+        values = {f"{name.capitalize()}Time": round(seconds * 1000, 3) for name, seconds in self.timings.items()}
+        units = {name: 'Milliseconds' for name in values}
+        for name, value in self.counters.items():
+            values[name] = value
+            units[name] = 'Bytes' if name.startswith('Bytes') else 'Count'
+        values[memory_name] = peak_memory
+        units[memory_name] = 'Megabytes'
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [list(self.dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, unit in units.items()],
+                }],
+            },
+            **self.dimensions,
+            **values,
+            **self.properties,
+        }
+
+    def emit(self):
+        print(json.dumps(self.record(), default=str))
+
+
+class MeteredBody:
+    def __init__(self, body, metrics, phase):
+        self.body = body
+        self.metrics = metrics
+        self.phase = phase
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        data = self.body.read(size)
+        self.metrics.add_time(self.phase, time.perf_counter() - start)
+        self.metrics.count('BytesRead', len(data))
+        return data
+
+    def close(self):
+        self.body.close()
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread from a background thread
+
+    Only runs when PROFILE_SAMPLE_INTERVAL (seconds) is set, so a normal
+    invocation pays nothing for it. stop() returns the most frequent stacks in
+    collapsed "outer;inner" form with their sample counts.
+    """
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    @classmethod
+    def from_environment(cls):
+        interval = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0) or 0)
+        if interval <= 0:
+            return None
+        profiler = cls(interval)
+        profiler.thread.start()
+        return profiler
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def stop(self, top=20):
+        self.stopped.set()
+        self.thread.join()
+        return dict(sorted(self.samples.items(), key=lambda item: -item[1])[:top])
+
+
+def result_cache_key(bucket_name, input_key, head_response, part):
+    # Prefer the version ID, falling back to the ETag on unversioned buckets
+    version = head_response.get('VersionId') or head_response['ETag'].strip('"')
+    return f"{bucket_name}/{input_key}@{version}#part{part}"
+
+
+def remember_result(cache_key, total_sum):
+    result_cache[cache_key] = total_sum
+    result_cache.move_to_end(cache_key)
+    while len(result_cache) > RESULT_CACHE_SIZE:
+        result_cache.popitem(last=False)
+
+
+def recall_result(cache_key):
+    """Sum cached in this container for cache_key, or None"""
+    if cache_key not in result_cache:
+        return None
+    result_cache.move_to_end(cache_key)
+    return result_cache[cache_key]
+
+
+def find_cached_result(bucket_name, output_key, cache_key):
+    """Look a result up in the warm-container cache and in the output's metadata
+
+    A sum found in memory only saves the scan: other containers may have
+    written output_key since, so it is always checked with a head_object for
+    the cache key written alongside the sum. A repeat call on a cold container
+    therefore costs two head_objects, one for the input and one for the output.
+
+    :return: (cached sum or None, True if output_key already holds that sum)
+    """
+    from botocore.exceptions import ClientError
+
+    s3 = get_client('s3')
+    total_sum = recall_result(cache_key)
+    try:
+        metadata = s3.head_object(Bucket=bucket_name, Key=output_key).get('Metadata', {})
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+        metadata = {}
+    if metadata.get('cache-key') == cache_key and 'calibration-sum' in metadata:
+        total_sum = int(metadata['calibration-sum'])
+        remember_result(cache_key, total_sum)
+        return total_sum, True
+    return total_sum, False
+
+
+def put_calibration_result(bucket_name, output_key, total_sum, metadata=None, condition='none'):
+    """Write the sum to output_key with a single put_object straight from memory
+
+    S3 rejects the body if it does not match ContentMD5, so a successful
+    response confirms the write without a head_object.
+
+    :param condition: 'if-none-match' to only create output_key if it is absent
+    :return: False if the condition kept an existing output_key, else True
+    """
+    from botocore.exceptions import ClientError
+
+    s3 = get_client('s3')
+    body = str(total_sum).encode('utf-8')
+    params = {
+        'Bucket': bucket_name,
+        'Key': output_key,
+        'Body': body,
+        'ContentMD5': base64.b64encode(hashlib.md5(body).digest()).decode('ascii'),
+        'ContentType': 'text/plain',
+    }
+    if metadata:
+        params['Metadata'] = metadata
+    if condition == 'if-none-match':
+        params['IfNoneMatch'] = '*'
+    elif condition != 'none':
+        raise ValueError(f"Unknown output condition: {condition}")
+
+    logger.debug(f"Attempting to put {output_key} to {bucket_name}")
+    try:
+        s3.put_object(**params)
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        if error_code in ('PreconditionFailed', '412'):
+            logger.info(f"{output_key} already exists in {bucket_name}, not overwritten")
+            return False
+        logger.error(f"Failed to put {output_key}. Error code: {error_code}, Message: {e.response['Error']['Message']}")
+        raise
+    logger.debug(f"Successfully put {output_key} to {bucket_name}")
+    return True
+
 
 def lambda_handler(event, context):
+    # Fan-out workers are invocations of this same function
+    action = (event or {}).get('action', 'calibrate')
+    metrics = Metrics({'Action': action})
+    metrics.reset_peak_memory()
+    profiler = SamplingProfiler.from_environment()
+    response = None
+    try:
+        if action == 'shard':
+            response = shard_handler(event, context)
+        elif action == 'batch':
+            response = batch_handler(event, context)
+        else:
+            response = calibration_handler(event, context, metrics)
+        return response
+    except Exception as e:
+        logger.error(f"An error occurred: {str(e)}", exc_info=True)
+        response = {
+            'statusCode': 500,
+            'body': f'An error occurred: {str(e)}'
+        }
+        return response
+    finally:
+        metrics.properties['StatusCode'] = (response or {}).get('statusCode', 500)
+        if context is not None:
+            metrics.properties['RequestId'] = getattr(context, 'aws_request_id', None)
+        if profiler:
+            metrics.properties['Profile'] = profiler.stop()
+        metrics.emit()
+
+
+def calibration_handler(event, context, metrics):
+    from botocore.exceptions import ClientError
+
+    s3 = get_client('s3')
     bucket_name = 'advent-of-code-day'
     input_key = 'input.txt'
     output_key = 'output.txt'
+    # 'stream' reads the object body in chunks, 'download' copies it to /tmp first,
+    # 'sharded' splits it into ranged GETs processed by several worker processes,
+    # 'fan_out' splits it across many asynchronous invocations of this function,
+    # 'incremental' only reads what was appended since the last checkpoint
+    input_mode = (event or {}).get('input_mode', os.environ.get('INPUT_MODE', 'stream'))
+    # Part 2 also counts spelled-out digits such as "one" and "nine"
+    part = int((event or {}).get('part', os.environ.get('CALIBRATION_PART', 1)))
+    # Skip the scan when the input's version has already been scored in this mode; in lean
+    # stream mode only this container's results are used, other setups also check output_key
+    use_cache = str((event or {}).get('result_cache', os.environ.get('RESULT_CACHE', 'on'))).lower() not in ('off', 'false', '0')
+    # Also write every line's digits as Parquet for the calibration_lines Athena table
+    emit_lines = str((event or {}).get('emit_lines', os.environ.get('EMIT_LINES', 'off'))).lower() in ('on', 'true', '1')
+    # 'lean' sends the result with one checksummed put_object, 'verified' checks the
+    # bucket first, uploads through /tmp and confirms the upload with a head_object
+    write_mode = (event or {}).get('write_mode', os.environ.get('WRITE_MODE', 'lean'))
+    # 'if-none-match' makes lean writes only create output_key when it does not exist yet
+    output_condition = (event or {}).get('output_condition', os.environ.get('OUTPUT_CONDITION', 'none'))
+    # Per-line results are partitioned by the UTC date of the run that wrote them
+    run_date = datetime.now(timezone.utc).date().isoformat()
+    metrics.dimensions.update({'InputMode': input_mode, 'Part': str(part)})
     
-    try:
-        # Check if the bucket exists
+    if write_mode not in ('lean', 'verified'):
+        raise ValueError(f"Unknown write mode: {write_mode}")
+    # Check if the bucket exists; in lean mode the first read reports a missing bucket instead
+    if write_mode == 'verified':
         try:
-            s3.head_bucket(Bucket=bucket_name)
-            logger.info(f"Bucket {bucket_name} exists and is accessible")
+            with metrics.phase('head'):
+                s3.head_bucket(Bucket=bucket_name)
+            logger.debug(f"Bucket {bucket_name} exists and is accessible")
         except ClientError as e:
             logger.error(f"Bucket {bucket_name} is not accessible: {str(e)}")
             raise
 
-        # Download the file from S3
-        logger.info(f"Attempting to download {input_key} from {bucket_name}")
-        try:
-            s3.download_file(bucket_name, input_key, '/tmp/input.txt')
-            logger.info(f"Successfully downloaded {input_key}")
-        except ClientError as e:
-            logger.error(f"Failed to download {input_key}: {str(e)}")
-            raise
+    cache_key = None
+    total_sum = None
+    input_response = None
+    if use_cache and write_mode == 'lean' and input_mode == 'stream':
+        # The input's own GetObject carries the version the cache is keyed on, and output_key
+        # is rewritten rather than checked, so a hit in this container only skips the scan
+        with metrics.phase('stream'):
+            input_response = s3.get_object(Bucket=bucket_name, Key=input_key)
+        cache_key = result_cache_key(bucket_name, input_key, input_response, part)
+        if emit_lines:
+            cache_key += f'+lines@{run_date}'
+        total_sum = recall_result(cache_key)
+        metrics.properties['CacheHit'] = total_sum is not None
+        if total_sum is not None:
+            input_response['Body'].close()
+    elif use_cache:
+        with metrics.phase('head'):
+            head = s3.head_object(Bucket=bucket_name, Key=input_key)
+            cache_key = result_cache_key(bucket_name, input_key, head, part)
+            if emit_lines:
+                # A result cached without today's per-line output must not skip writing it
+                cache_key += f'+lines@{run_date}'
+            total_sum, output_current = find_cached_result(bucket_name, output_key, cache_key)
+        metrics.properties['CacheHit'] = total_sum is not None
+        if output_current:
+            logger.info(f"{output_key} already holds the sum {total_sum} for {cache_key}")
+            return {
+                'statusCode': 200,
+                'body': 'Input unchanged, cached result already uploaded'
+            }
 
-        total = []
+    if total_sum is None:
+        line_writer = CalibrationLineWriter(s3, bucket_name, input_key, part, run_date) if emit_lines else None
+        total_sum = read_calibration_sum(bucket_name, input_key, input_mode, part, output_key, line_writer, metrics, context,
+                                         input_response)
+        logger.info(f"Calculated sum: {total_sum}")
+    else:
+        logger.info(f"Using cached sum: {total_sum}")
 
-        with open('/tmp/input.txt', 'r') as file:
-            for line in file:
-                digits = [char for char in line if char.isdigit()]
-                if digits:  # Check if there are any digits in the line
-                    first_digit = digits[0] 
-                    last_digit = digits[-1]
-                    number = int(first_digit + last_digit)
-                    total.append(number)
+    metadata = {}
+    if cache_key:
+        # Lets the next invocation find this result with a head_object
+        metadata = {'cache-key': cache_key, 'calibration-sum': str(total_sum)}
 
-        total_sum = sum(total)
-        logger.info(f"Calculated sum: {total_sum}")
-        
-        # Write the result to a local file
-        output_path = '/tmp/output.txt'
-        with open(output_path, 'w') as output_file:
-            output_file.write(str(total_sum))
-        
-        # Check if the file was created and has content
-        if not os.path.exists(output_path):
-            raise FileNotFoundError(f"Output file was not created at {output_path}")
-        
-        file_size = os.path.getsize(output_path)
-        logger.info(f"Output file size: {file_size} bytes")
-        if file_size == 0:
-            raise ValueError("Output file is empty")
+    if write_mode == 'lean':
+        with metrics.phase('upload'):
+            written = put_calibration_result(bucket_name, output_key, total_sum, metadata, output_condition)
+        if not written:
+            return {
+                'statusCode': 200,
+                'body': f'{output_key} already exists, left unchanged'
+            }
+        if cache_key:
+            remember_result(cache_key, total_sum)
+        return {
+            'statusCode': 200,
+            'body': 'File processed and result uploaded successfully'
+        }
+    
+    # Write the result to a local file
+    output_path = '/tmp/output.txt'
+    with open(output_path, 'w') as output_file:
+        output_file.write(str(total_sum))
+    
+    # Check if the file was created and has content
+    if not os.path.exists(output_path):
+        raise FileNotFoundError(f"Output file was not created at {output_path}")
+    
+    file_size = os.path.getsize(output_path)
+    logger.debug(f"Output file size: {file_size} bytes")
+    if file_size == 0:
+        raise ValueError("Output file is empty")
+    
+    # Upload the output file to S3
+    logger.debug(f"Attempting to upload {output_key} to {bucket_name}")
+    try:
+        extra_args = {'Metadata': metadata} if metadata else {}
+        with metrics.phase('upload'):
+            s3.upload_file(output_path, bucket_name, output_key, ExtraArgs=extra_args)
+        logger.debug(f"Successfully uploaded {output_key} to {bucket_name}")
         
-        # Upload the output file to S3
-        logger.info(f"Attempting to upload {output_key} to {bucket_name}")
+        # Verify the file was uploaded
         try:
-            s3.upload_file(output_path, bucket_name, output_key)
-            logger.info(f"Successfully uploaded {output_key} to {bucket_name}")
-            
-            # Verify the file was uploaded
-            try:
+            with metrics.phase('verify'):
                 s3.head_object(Bucket=bucket_name, Key=output_key)
-                logger.info(f"Verified {output_key} exists in {bucket_name}")
-            except ClientError as e:
-                if e.response['Error']['Code'] == "404":
-                    logger.error(f"File {output_key} was not found in {bucket_name} after upload")
-                else:
-                    logger.error(f"Error verifying file upload: {str(e)}")
-                raise
+            logger.debug(f"Verified {output_key} exists in {bucket_name}")
+            if cache_key:
+                remember_result(cache_key, total_sum)
         except ClientError as e:
-            error_code = e.response['Error']['Code']
-            error_message = e.response['Error']['Message']
-            logger.error(f"Failed to upload {output_key}. Error code: {error_code}, Message: {error_message}")
+            if e.response['Error']['Code'] == "404":
+                logger.error(f"File {output_key} was not found in {bucket_name} after upload")
+            else:
+                logger.error(f"Error verifying file upload: {str(e)}")
             raise
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        error_message = e.response['Error']['Message']
+        logger.error(f"Failed to upload {output_key}. Error code: {error_code}, Message: {error_message}")
+        raise
 
-        return {
-            'statusCode': 200,
-            'body': 'File processed and result uploaded successfully'
-        }
-    except Exception as e:
-        logger.error(f"An error occurred: {str(e)}", exc_info=True)
-        return {
-            'statusCode': 500,
-            'body': f'An error occurred: {str(e)}'
-        }
+    return {
+        'statusCode': 200,
+        'body': 'File processed and result uploaded successfully'
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sum the calibration values of local files, without any AWS calls")
+    parser.add_argument('input_files', nargs='*', default=['input.txt'])
+    parser.add_argument('--part', type=int, choices=(1, 2), default=1)
+    args = parser.parse_args()
+
+    for input_file in args.input_files:
+        with open(input_file, 'rb') as file:
+            print(f"{input_file}: {stream_calibration_sum(file, part=args.part)}")
+
+
+if __name__ == "__main__":
+    main()
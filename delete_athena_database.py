@@ -5,9 +5,9 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def delete_athena_database(database_name):
+def delete_athena_database(database_name, athena_client=None):
     # Create Athena client
-    athena_client = boto3.client('athena')
+    athena_client = athena_client or boto3.client('athena')
     
     try:
         # Delete the database
@@ -1,7 +1,12 @@
+import asyncio
 import boto3
+import codecs
+import csv
+import functools
 import os
-import time
 import logging
+from datetime import date, datetime, timezone
+from decimal import Decimal
 from botocore.exceptions import ClientError
 
 # Set up logging
@@ -9,65 +14,221 @@ logging.basicConfig(filename='athena_debug.log', level=logging.DEBUG,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger()
 
-def run_athena_query(query, database, s3_output):
-    client = boto3.client('athena')
-    
-    # Validate S3 output location
-    if not s3_output.startswith('s3://'):
-        logger.error(f"Invalid S3 output location: {s3_output}. Must start with 's3://'")
-        return 'FAILED', None
+def log_athena_error(e):
+    error_code = e.response['Error']['Code']
+    error_message = e.response['Error']['Message']
+    if error_code == 'InvalidRequestException':
+        logger.error(f"Invalid request: {error_message}")
+        logger.error("Please check that your S3 output location is correct and in the same region as your Athena query.")
+    elif error_code == 'AccessDeniedException':
+        logger.error("Access Denied: Insufficient permissions to execute Athena query.")
+        logger.error("Please ensure your IAM role has the necessary permissions for Athena and S3.")
+    else:
+        logger.error(f"AWS Error: {error_code} - {error_message}")
+
+
+class AthenaQueryRunner:
+    """Runs Athena queries from asyncio, polling each one with exponential backoff
+
+    Polling starts at initial_delay and grows by backoff up to max_delay, so a
+    short DDL statement returns in well under a second. At most
+    max_concurrency queries are in flight; submit() returns a task that can be
+    awaited later, so independent queries overlap.
+    """
+
+    def __init__(self, client=None, max_concurrency=5, initial_delay=0.05, max_delay=5.0, backoff=2.0):
+        self.client = client or boto3.client('athena')
+        self.max_concurrency = max_concurrency
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self._semaphore = None
+
+    async def _call(self, method, **kwargs):
+        # boto3 is blocking, so each call runs on the default thread pool
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(method, **kwargs))
+
+    def submit(self, query, database, s3_output):
+        """Start a query in the background; await the returned task for (state, query_execution_id)"""
+        return asyncio.ensure_future(self.run(query, database, s3_output))
+
+    async def run(self, query, database, s3_output):
+        # Created here so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await self._run(query, database, s3_output)
+
+    async def _run(self, query, database, s3_output):
+        # Validate S3 output location
+        if not s3_output.startswith('s3://'):
+            logger.error(f"Invalid S3 output location: {s3_output}. Must start with 's3://'")
+            return 'FAILED', None
+
+        try:
+            # Start the query execution
+            response = await self._call(
+                self.client.start_query_execution,
+                QueryString=query,
+                QueryExecutionContext={'Database': database},
+                ResultConfiguration={'OutputLocation': s3_output}
+            )
+
+            query_execution_id = response['QueryExecutionId']
+            logger.info(f"Started query execution with ID: {query_execution_id}")
+
+            # Wait for the query to complete, backing off between polls
+            delay = self.initial_delay
+            while True:
+                response = await self._call(self.client.get_query_execution, QueryExecutionId=query_execution_id)
+                state = response['QueryExecution']['Status']['State']
+
+                if state == 'SUCCEEDED':
+                    logger.info(f"Query succeeded: {query_execution_id}")
+                    return state, query_execution_id
+                elif state in ['FAILED', 'CANCELLED']:
+                    reason = response['QueryExecution']['Status'].get('StateChangeReason', 'No reason provided')
+                    logger.error(f"Query {state.lower()}: {query_execution_id}. Reason: {reason}")
+                    return state, query_execution_id
+
+                logger.info(f"Query is still running. Current state: {state}, next check in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * self.backoff, self.max_delay)
+
+        except ClientError as e:
+            log_athena_error(e)
+            return 'FAILED', None
+        except Exception as e:
+            logger.error(f"An unexpected error occurred: {str(e)}")
+            return 'FAILED', None
+
+
+def run_athena_query(query, database, s3_output, client=None):
+    return asyncio.run(AthenaQueryRunner(client).run(query, database, s3_output))
+
+
+# Per-line results written by day1.CalibrationLineWriter. Partition projection
+# maps source and run_date straight to S3 prefixes, so queries filtering on
+# them read only those files and no MSCK REPAIR is needed for new partitions.
+# source is the URL-quoted input key and must be given in the WHERE clause.
+CALIBRATION_LINES_DDL = """
+CREATE EXTERNAL TABLE IF NOT EXISTS calibration_lines (
+    line_number BIGINT,
+    first_digit TINYINT,
+    last_digit TINYINT,
+    value INT,
+    part TINYINT
+)
+PARTITIONED BY (source STRING, run_date STRING)
+STORED AS PARQUET
+LOCATION 's3://advent-of-code-day/calibration_lines/'
+TBLPROPERTIES (
+    'parquet.compression'='SNAPPY',
+    'projection.enabled'='true',
+    'projection.source.type'='injected',
+    'projection.run_date.type'='date',
+    'projection.run_date.format'='yyyy-MM-dd',
+    'projection.run_date.range'='2023-12-01,NOW',
+    'storage.location.template'='s3://advent-of-code-day/calibration_lines/source=${source}/run_date=${run_date}/'
+)
+"""
+
+# Converts Athena's string values to Python types, by column type
+ATHENA_TYPE_CONVERTERS = {
+    'tinyint': int,
+    'smallint': int,
+    'integer': int,
+    'bigint': int,
+    'float': float,
+    'real': float,
+    'double': float,
+    'decimal': Decimal,
+    'boolean': lambda value: value.lower() == 'true',
+    'date': date.fromisoformat,
+    'timestamp': datetime.fromisoformat,
+}
+
+
+def convert_value(value, type_name):
+    if value is None:
+        return None
+    converter = ATHENA_TYPE_CONVERTERS.get(type_name.lower())
+    if converter is None:
+        return value
+    # Athena writes NULL as an empty field in CSV results
+    if value == '':
+        return None
+    return converter(value)
 
+
+def iter_query_results(query_execution_id, client=None, page_size=1000):
+    """Yield the rows of a finished query as dicts of typed values
+
+    Pages through get_query_results with NextToken, holding one page at a time.
+    """
+    client = client or boto3.client('athena')
+    kwargs = {'QueryExecutionId': query_execution_id, 'MaxResults': page_size}
+    columns = None
+    while True:
+        response = client.get_query_results(**kwargs)
+        rows = response['ResultSet']['Rows']
+        if columns is None:
+            columns = [(column['Name'], column['Type']) for column in response['ResultSet']['ResultSetMetadata']['ColumnInfo']]
+            # SELECT results repeat the column names as their first row
+            if rows and [datum.get('VarCharValue') for datum in rows[0]['Data']] == [name for name, _ in columns]:
+                rows = rows[1:]
+        for row in rows:
+            yield {
+                name: convert_value(datum.get('VarCharValue'), type_name)
+                for (name, type_name), datum in zip(columns, row['Data'])
+            }
+        if not response.get('NextToken'):
+            break
+        kwargs['NextToken'] = response['NextToken']
+
+
+def stream_query_results_csv(query_execution_id, client=None, s3_client=None):
+    """Yield the rows of a finished query by streaming its CSV result file from S3
+
+    Cheaper than get_query_results for large results: one GET read line by line.
+    """
+    client = client or boto3.client('athena')
+    s3_client = s3_client or boto3.client('s3')
+    execution = client.get_query_execution(QueryExecutionId=query_execution_id)['QueryExecution']
+    output_location = execution['ResultConfiguration']['OutputLocation']
+    bucket, _, key = output_location[len('s3://'):].partition('/')
+
+    # Only the column types are needed from the API
+    metadata = client.get_query_results(QueryExecutionId=query_execution_id, MaxResults=1)
+    types = {column['Name']: column['Type'] for column in metadata['ResultSet']['ResultSetMetadata']['ColumnInfo']}
+
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
     try:
-        # Start the query execution
-        response = client.start_query_execution(
-            QueryString=query,
-            QueryExecutionContext={'Database': database},
-            ResultConfiguration={'OutputLocation': s3_output}
-        )
-        
-        query_execution_id = response['QueryExecutionId']
-        logger.info(f"Started query execution with ID: {query_execution_id}")
-        
-        # Wait for the query to complete
-        while True:
-            response = client.get_query_execution(QueryExecutionId=query_execution_id)
-            state = response['QueryExecution']['Status']['State']
-            
-            if state == 'SUCCEEDED':
-                logger.info(f"Query succeeded: {query_execution_id}")
-                return state, query_execution_id
-            elif state in ['FAILED', 'CANCELLED']:
-                reason = response['QueryExecution']['Status'].get('StateChangeReason', 'No reason provided')
-                logger.error(f"Query {state.lower()}: {query_execution_id}. Reason: {reason}")
-                return state, query_execution_id
-            
-            logger.info(f"Query is still running. Current state: {state}")
-            time.sleep(5)  # Wait for 5 seconds before checking again
-    
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        if error_code == 'InvalidRequestException':
-            logger.error(f"Invalid request: {error_message}")
-            logger.error("Please check that your S3 output location is correct and in the same region as your Athena query.")
-        elif error_code == 'AccessDeniedException':
-            logger.error("Access Denied: Insufficient permissions to execute Athena query.")
-            logger.error("Please ensure your IAM role has the necessary permissions for Athena and S3.")
-        else:
-            logger.error(f"AWS Error: {error_code} - {error_message}")
-        return 'FAILED', None
-    except Exception as e:
-        logger.error(f"An unexpected error occurred: {str(e)}")
-        return 'FAILED', None
+        reader = csv.reader(codecs.getreader('utf-8')(body))
+        header = next(reader, None)
+        if header is None:
+            return
+        for values in reader:
+            yield {name: convert_value(value, types.get(name, 'varchar')) for name, value in zip(header, values)}
+    finally:
+        body.close()
 
-def list_tables(database):
-    client = boto3.client('athena')
+
+def iter_table_metadata(database, client=None, catalog='AwsDataCatalog'):
+    client = client or boto3.client('athena')
+    kwargs = {'CatalogName': catalog, 'DatabaseName': database}
+    while True:
+        response = client.list_table_metadata(**kwargs)
+        yield from response['TableMetadataList']
+        if not response.get('NextToken'):
+            break
+        kwargs['NextToken'] = response['NextToken']
+
+
+def list_tables(database, client=None):
     try:
-        response = client.list_table_metadata(
-            CatalogName='AwsDataCatalog',
-            DatabaseName=database
-        )
-        tables = [table['Name'] for table in response['TableMetadataList']]
+        tables = [table['Name'] for table in iter_table_metadata(database, client)]
         logger.info(f"Tables in database {database}: {', '.join(tables)}")
         return tables
     except ClientError as e:
@@ -94,34 +255,21 @@ def create_database(database_name, s3_output):
         logger.error(f"Failed to create database '{database_name}'. Query ID: {query_id}")
         return False
 
-def main():
+async def main_async(runner=None, run_date=None):
     database = 'advent_of_code_db'  # New database name
     s3_output = 's3://advent-of-code-day/query_results/'  # S3 bucket for query results
+    runner = runner or AthenaQueryRunner(max_concurrency=int(os.environ.get('ATHENA_MAX_CONCURRENCY', 5)))
 
     # Create the database
-    if not create_database(database, s3_output):
+    logger.info(f"Creating database: {database}")
+    state, query_id = await runner.run(f"CREATE DATABASE IF NOT EXISTS {database}", 'default', s3_output)
+    if state != 'SUCCEEDED':
+        logger.error(f"Failed to create database '{database}'. Query ID: {query_id}")
         return
-
-    # Updated create table query for a single column, specifically for output.txt
-    create_table_query = """
-    CREATE EXTERNAL TABLE IF NOT EXISTS output_data (
-        value STRING
-    )
-    ROW FORMAT DELIMITED
-    FIELDS TERMINATED BY '\n'
-    STORED AS TEXTFILE
-    LOCATION 's3://advent-of-code-day/'
-    TBLPROPERTIES (
-        'skip.header.line.count'='0',
-        'serialization.null.format'='',
-        'input.format'='org.apache.hadoop.mapred.TextInputFormat',
-        'input.regex'='(.*)',
-        'input.filename'='output.txt'
-    )
-    """
+    logger.info(f"Database '{database}' created successfully")
 
     logger.info("Creating Athena table...")
-    state, query_id = run_athena_query(create_table_query, database, s3_output)
+    state, query_id = await runner.run(CALIBRATION_LINES_DDL, database, s3_output)
     if state != 'SUCCEEDED':
         if query_id is None:
             logger.error("Failed to start query execution. Check your AWS permissions.")
@@ -129,21 +277,34 @@ def main():
             logger.error(f"Failed to create table. Query ID: {query_id}")
         return
 
-    logger.info("Listing tables in the database...")
-    tables = list_tables(database)
-    if 'output_data' not in tables:
+    # Only one partition is read: input.txt as written by day1 on run_date, today (UTC) by default.
+    # day1 replaces a source's earlier partitions, so older dates hold no second copy of its lines
+    run_date = run_date or datetime.now(timezone.utc).date().isoformat()
+    analysis_query = f"""
+    SELECT part, count(*) AS lines, sum(value) AS total
+    FROM calibration_lines
+    WHERE source = 'input.txt' AND run_date = '{run_date}'
+    GROUP BY part
+    """
+
+    # The table check and the analysis query are independent, so run them together
+    logger.info("Listing tables in the database and running analysis query...")
+    analysis = runner.submit(analysis_query, database, s3_output)
+    tables = await asyncio.get_running_loop().run_in_executor(None, list_tables, database, runner.client)
+    state, query_id = await analysis
+    if 'calibration_lines' not in tables:
         logger.error("The table was not created successfully")
         return
 
-    # Updated analysis query
-    analysis_query = "SELECT value FROM output_data LIMIT 10"
-
-    logger.info("Running analysis query...")
-    state, query_id = run_athena_query(analysis_query, database, s3_output)
     if state == 'SUCCEEDED':
         logger.info("Analysis query completed successfully")
+        for row in iter_query_results(query_id, runner.client):
+            logger.info(f"Result row: {row}")
     else:
         logger.error("Analysis query failed")
 
+def main():
+    asyncio.run(main_async())
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
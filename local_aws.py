@@ -0,0 +1,570 @@
+import base64
+import hashlib
+import io
+import os
+import shutil
+import json
+import logging
+import itertools
+import threading
+import time
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+
+def client_error(code, message, operation_name):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation_name)
+
+
+class LocalBody(io.BytesIO):
+    """Stand-in for the StreamingBody returned by get_object"""
+
+
+class LocalFile:
+    """Object content kept in a local file, so LocalS3 can serve inputs larger than memory"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __len__(self):
+        return os.path.getsize(self.path)
+
+    def etag(self):
+        # Hashing a multi-GB file on every head_object would dominate a benchmark
+        stat = os.stat(self.path)
+        return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+    def open(self, start=0, length=None):
+        return LocalFileBody(self.path, start, len(self) - start if length is None else length)
+
+
+class LocalFileBody:
+    """Streaming body over a byte range of a local file"""
+
+    def __init__(self, path, start, length):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class LocalPaginator:
+    def __init__(self, method, page_size=1000):
+        self.method = method
+        self.page_size = page_size
+
+    def paginate(self, **kwargs):
+        token = None
+        while True:
+            if token:
+                kwargs['ContinuationToken'] = token
+            page = self.method(MaxKeys=self.page_size, **kwargs)
+            yield page
+            token = page.get('NextContinuationToken')
+            if not token:
+                break
+
+
+class LocalS3:
+    """In-memory stand-in for the subset of the S3 client used in this repo
+
+    Objects live in a dict of bucket name -> key -> bytes (or a LocalFile for
+    large inputs). Every call is recorded in `calls`, so the number of
+    round-trips can be checked.
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = {name: dict(objects) for name, objects in (buckets or {}).items()}
+        self.metadata = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _record(self, operation, **kwargs):
+        with self.lock:
+            self.calls.append((operation, kwargs))
+
+    def _objects(self, bucket, operation):
+        if bucket not in self.buckets:
+            raise client_error('NoSuchBucket', 'The specified bucket does not exist', operation)
+        return self.buckets[bucket]
+
+    def _data(self, bucket, key, operation, not_found_code='NoSuchKey'):
+        objects = self._objects(bucket, operation)
+        if key not in objects:
+            raise client_error(not_found_code, 'The specified key does not exist.', operation)
+        return objects[key]
+
+    @staticmethod
+    def etag(data):
+        if isinstance(data, LocalFile):
+            return data.etag()
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def head_bucket(self, Bucket):
+        self._record('HeadBucket', Bucket=Bucket)
+        self._objects(Bucket, 'HeadBucket')
+        return {}
+
+    def head_object(self, Bucket, Key):
+        self._record('HeadObject', Bucket=Bucket, Key=Key)
+        data = self._data(Bucket, Key, 'HeadObject', not_found_code='404')
+        return {'ContentLength': len(data), 'ETag': self.etag(data), 'Metadata': dict(self.metadata.get((Bucket, Key), {}))}
+
+    def get_object(self, Bucket, Key, Range=None):
+        self._record('GetObject', Bucket=Bucket, Key=Key, Range=Range)
+        data = self._data(Bucket, Key, 'GetObject')
+        etag = self.etag(data)
+        start, end = 0, len(data)
+        if Range:
+            first, last = Range[len('bytes='):].split('-')
+            if int(first) >= len(data):
+                raise client_error('InvalidRange', 'The requested range is not satisfiable', 'GetObject')
+            start, end = int(first), min(int(last) + 1 if last else end, end)
+        if isinstance(data, LocalFile):
+            return {'Body': data.open(start, end - start), 'ContentLength': end - start, 'ETag': etag}
+        return {'Body': LocalBody(data[start:end]), 'ContentLength': end - start, 'ETag': etag}
+
+    def put_object(self, Bucket, Key, Body=b'', ContentMD5=None, IfNoneMatch=None, **kwargs):
+        self._record('PutObject', Bucket=Bucket, Key=Key)
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        elif hasattr(Body, 'read'):
+            Body = Body.read()
+        objects = self._objects(Bucket, 'PutObject')
+        if ContentMD5 is not None and base64.b64decode(ContentMD5) != hashlib.md5(Body).digest():
+            raise client_error('BadDigest', 'The Content-MD5 you specified did not match what we received', 'PutObject')
+        if IfNoneMatch == '*' and Key in objects:
+            raise client_error('PreconditionFailed', 'At least one of the pre-conditions you specified did not hold', 'PutObject')
+        objects[Key] = bytes(Body)
+        self.metadata[(Bucket, Key)] = dict(kwargs.get('Metadata', {}))
+        return {'ETag': self.etag(Body)}
+
+    def delete_objects(self, Bucket, Delete):
+        self._record('DeleteObjects', Bucket=Bucket)
+        objects = self._objects(Bucket, 'DeleteObjects')
+        deleted = []
+        for item in Delete['Objects']:
+            objects.pop(item['Key'], None)
+            self.metadata.pop((Bucket, item['Key']), None)
+            deleted.append({'Key': item['Key']})
+        return {'Deleted': deleted}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None):
+        self._record('ListObjectsV2', Bucket=Bucket, Prefix=Prefix)
+        objects = self._objects(Bucket, 'ListObjectsV2')
+        keys = sorted(key for key in objects if key.startswith(Prefix))
+        if ContinuationToken:
+            keys = [key for key in keys if key > ContinuationToken]
+        page = keys[:MaxKeys]
+        response = {
+            'KeyCount': len(page),
+            'Contents': [{'Key': key, 'Size': len(objects[key]), 'ETag': self.etag(objects[key])} for key in page],
+        }
+        if len(keys) > MaxKeys:
+            response['IsTruncated'] = True
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+    def get_paginator(self, operation_name):
+        if operation_name != 'list_objects_v2':
+            raise NotImplementedError(f"LocalS3 has no paginator for {operation_name}")
+        return LocalPaginator(self.list_objects_v2)
+
+    def download_file(self, Bucket, Key, Filename):
+        self._record('DownloadFile', Bucket=Bucket, Key=Key)
+        data = self._data(Bucket, Key, 'GetObject', not_found_code='404')
+        if isinstance(data, LocalFile):
+            shutil.copyfile(data.path, Filename)
+            return
+        with open(Filename, 'wb') as file:
+            file.write(data)
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Config=None):
+        self._record('UploadFile', Bucket=Bucket, Key=Key)
+        with open(Filename, 'rb') as file:
+            self._objects(Bucket, 'PutObject')[Key] = file.read()
+        self.metadata[(Bucket, Key)] = dict((ExtraArgs or {}).get('Metadata', {}))
+
+
+class LocalLambda:
+    """In-process stand-in for the Lambda client's invoke call
+
+    'Event' invocations run the handler on a background thread, like
+    Lambda's asynchronous invocations. `drop` lists payload predicates: an
+    invocation matching one is swallowed once, to simulate a lost worker.
+    """
+
+    def __init__(self, handler, drop=None):
+        self.handler = handler
+        self.drop = list(drop or [])
+        self.invocations = []
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def invoke(self, FunctionName, Payload=b'{}', InvocationType='RequestResponse'):
+        event = json.loads(Payload)
+        with self.lock:
+            self.invocations.append((FunctionName, event))
+            for predicate in self.drop:
+                if predicate(event):
+                    self.drop.remove(predicate)
+                    logger.info(f"Dropping invocation of {FunctionName}")
+                    return {'StatusCode': 202}
+        if InvocationType == 'Event':
+            thread = threading.Thread(target=self.handler, args=(event, None), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+            return {'StatusCode': 202}
+        result = self.handler(event, None)
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(result).encode('utf-8'))}
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+class LocalAthena:
+    """In-memory stand-in for the Athena client's query calls
+
+    Each query stays RUNNING for `duration` seconds (or durations[query] when
+    given), then SUCCEEDED, or FAILED if it contains `fail_marker`.
+    CREATE EXTERNAL TABLE statements register the table for list_table_metadata,
+    and queries listed in `results` return those rows from get_query_results.
+    """
+
+    def __init__(self, duration=0.3, durations=None, fail_marker='FAIL', results=None):
+        self.duration = duration
+        # Query string -> (list of (column name, type), list of rows of strings)
+        self.results = results or {}
+        self.durations = durations or {}
+        self.fail_marker = fail_marker
+        self.executions = {}
+        self.tables = {}
+        self.polls = 0
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def start_query_execution(self, QueryString, QueryExecutionContext=None, ResultConfiguration=None, **kwargs):
+        with self.lock:
+            query_execution_id = f"local-{next(self.ids)}"
+            duration = self.durations.get(QueryString, self.duration)
+            self.executions[query_execution_id] = {
+                'query': QueryString,
+                'database': (QueryExecutionContext or {}).get('Database', 'default'),
+                'output': (ResultConfiguration or {}).get('OutputLocation'),
+                'done_at': time.monotonic() + duration,
+                'finished': False,
+            }
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        return {'QueryExecutionId': query_execution_id}
+
+    def get_query_execution(self, QueryExecutionId):
+        with self.lock:
+            self.polls += 1
+            execution = self.executions.get(QueryExecutionId)
+            if execution is None:
+                raise client_error('InvalidRequestException', f"Query {QueryExecutionId} was not found", 'GetQueryExecution')
+            status = {'State': 'RUNNING'}
+            if time.monotonic() >= execution['done_at']:
+                if not execution['finished']:
+                    execution['finished'] = True
+                    self.running -= 1
+                    self._apply(execution)
+                if self.fail_marker in execution['query']:
+                    status = {'State': 'FAILED', 'StateChangeReason': 'Query contained the failure marker'}
+                else:
+                    status = {'State': 'SUCCEEDED'}
+        return {
+            'QueryExecution': {
+                'QueryExecutionId': QueryExecutionId,
+                'Status': status,
+                'ResultConfiguration': {'OutputLocation': f"{execution['output']}{QueryExecutionId}.csv"},
+            }
+        }
+
+    def _apply(self, execution):
+        words = execution['query'].split()
+        upper = [word.upper() for word in words]
+        if upper[:3] == ['CREATE', 'EXTERNAL', 'TABLE']:
+            name = words[6] if upper[3:6] == ['IF', 'NOT', 'EXISTS'] else words[3]
+            self.tables.setdefault(execution['database'], set()).add(name.split('(')[0])
+
+    def get_query_results(self, QueryExecutionId, MaxResults=1000, NextToken=None):
+        execution = self.executions[QueryExecutionId]
+        columns, rows = self.results.get(execution['query'], ([], []))
+        # Like Athena, the first row of a SELECT result holds the column names
+        rows = [[name for name, _ in columns]] + list(rows) if columns else []
+        return self._page(
+            {'ResultSet': {'ResultSetMetadata': {'ColumnInfo': [{'Name': name, 'Type': type_name} for name, type_name in columns]}}},
+            'Rows', [{'Data': [{} if value is None else {'VarCharValue': value} for value in row]} for row in rows],
+            MaxResults, NextToken, nested='ResultSet'
+        )
+
+    def list_table_metadata(self, CatalogName, DatabaseName, MaxResults=50, NextToken=None):
+        tables = sorted(self.tables.get(DatabaseName, ()))
+        return self._page({}, 'TableMetadataList', [{'Name': name} for name in tables], MaxResults, NextToken)
+
+    @staticmethod
+    def _page(response, field, items, page_size, token, nested=None):
+        start = int(token or 0)
+        target = response[nested] if nested else response
+        target[field] = items[start:start + page_size]
+        if start + page_size < len(items):
+            response['NextToken'] = str(start + page_size)
+        return response
+
+
+def run_local_fan_out(input_file='input.txt', part=1, shard_size=4096):
+    """Run the fan-out orchestration of day1 end to end against the stand-ins"""
+    import day1
+
+    with open(input_file, 'rb') as file:
+        data = file.read()
+    day1.clients['s3'] = LocalS3({'advent-of-code-day': {'input.txt': data}})
+    # Lose the first shard once, so the retry path is exercised too
+    lambda_client = LocalLambda(day1.lambda_handler, drop=[lambda event: event.get('start') == 0])
+    total_sum = day1.fan_out_calibration_sum(
+        'advent-of-code-day', 'input.txt', part, lambda_client=lambda_client,
+        shard_size=shard_size, shard_timeout=1, poll_interval=0.05
+    )
+    lambda_client.join()
+    expected = day1.stream_calibration_sum(io.BytesIO(data), part=part)
+    print(f"Fan-out sum: {total_sum} over {len(lambda_client.invocations)} invocations, streaming sum: {expected}")
+    return total_sum == expected
+
+
+def run_local_sharded(input_file='input.txt'):
+    """Check day1.shard_calibration_sum over many byte-range splits against a full scan
+
+    The inputs cover ranges that start right after a newline (equal-length
+    lines split at line boundaries), ranges holding no newline at all (a line
+    longer than several shards, and one-byte shards), and inputs with and
+    without a trailing newline.
+    """
+    import day1
+
+    with open(input_file, 'rb') as file:
+        real = file.read()
+    inputs = {
+        input_file: real,
+        f"{input_file} with a trailing newline": real.rstrip(b'\n') + b'\n',
+        'equal-length lines': b'a1b2\n' * 20,
+        'equal-length lines, no trailing newline': (b'a1b2\n' * 20)[:-1],
+        'one long line': b'three' + b'x' * 20000 + b'4z\nnine8\n' + b'1two\n' * 10 + b'seven',
+    }
+    ok = True
+    for name, data in inputs.items():
+        client = LocalS3({'advent-of-code-day': {'input.txt': data}})
+        shard_counts = {1, 2, 3, 7, 20, 64}
+        if len(data) <= 200:
+            # One-byte shards: most start right after a newline or hold none
+            shard_counts.add(len(data))
+        mismatches = 0
+        for part in (1, 2):
+            expected = day1.stream_calibration_sum(io.BytesIO(data), part=part)
+            for shard_count in sorted(shard_counts):
+                total_sum = sum(
+                    day1.shard_calibration_sum(client, 'advent-of-code-day', 'input.txt', start, end, len(data), part)
+                    for start, end in day1.plan_shards(len(data), shard_count)
+                )
+                if total_sum != expected:
+                    print(f"{name}, part {part}, {shard_count} shards: {total_sum}, streaming sum: {expected}")
+                    mismatches += 1
+        print(f"Sharded sums of {name}: {mismatches} mismatches over {len(shard_counts)} splits and both parts")
+        ok = ok and not mismatches
+    return ok
+
+
+def run_local_incremental(input_file='input.txt'):
+    """Check day1.incremental_calibration_sum across appends, truncations and rewrites
+
+    Every run is compared with a full rescan of the object as it is then, and
+    the path taken is read from the recorded GETs: a resume only makes ranged
+    reads, a rescan reads the whole object, and a last line longer than a
+    chunk makes the checkpoint tail be fetched with a bounded range.
+    """
+    import day1
+
+    with open(input_file, 'rb') as file:
+        data = file.read()
+    lines = data.split(b'\n')
+    long_line = b'eight' + b'x' * (day1.CHUNK_SIZE + day1.CHECKPOINT_TAIL_LENGTH) + b'7'
+
+    def rewrite_before_last_newline(old):
+        position = old.rfind(b'\n') - 5
+        return old[:position] + (b'8' if old[position:position + 1] == b'9' else b'9') + old[position + 1:]
+
+    # (description, change to the object, expected path)
+    steps = [
+        ('first run', lambda old: b'\n'.join(lines[:500]) + b'\n', 'rescan'),
+        ('lines appended', lambda old: old + b'\n'.join(lines[500:800]), 'resume'),
+        ('unchanged', lambda old: old, 'resume'),
+        ('unterminated last line completed', lambda old: old + b'\n' + b'\n'.join(lines[800:]) + b'\n', 'resume'),
+        ('long unterminated line appended', lambda old: old + long_line, 'resume'),
+        ('line completed, another long one appended', lambda old: old + b'\n1two\n' + long_line, 'refetch'),
+        ('long line completed', lambda old: old + b'\n1two\n', 'resume'),
+        ('truncated inside the checkpoint tail', lambda old: old[:-3], 'rescan'),
+        ('truncated before the checkpoint tail', lambda old: old[:len(old) // 4], 'rescan'),
+        ('byte rewritten inside the checkpoint tail', rewrite_before_last_newline, 'rescan'),
+        ('rewritten with different lines', lambda old: b'\n'.join(reversed(lines)), 'rescan'),
+    ]
+    ok = True
+    for part in (1, 2):
+        s3 = LocalS3({'advent-of-code-day': {}})
+        day1.clients['s3'] = s3
+        objects = s3.buckets['advent-of-code-day']
+        for name, change, expected_path in steps:
+            objects['input.txt'] = change(objects.get('input.txt', b''))
+            first_call = len(s3.calls)
+            total_sum = day1.incremental_calibration_sum('advent-of-code-day', 'input.txt', 'output.txt', part)
+            ranges = [
+                kwargs.get('Range') for operation, kwargs in s3.calls[first_call:]
+                if operation == 'GetObject' and kwargs['Key'] == 'input.txt'
+            ]
+            if None in ranges:
+                path = 'rescan'
+            elif any(not byte_range.endswith('-') for byte_range in ranges):
+                path = 'refetch'
+            else:
+                path = 'resume'
+            expected = day1.stream_calibration_sum(io.BytesIO(objects['input.txt']), part=part)
+            print(f"Part {part}, {name}: {path}, sum {total_sum}, full rescan {expected}")
+            if total_sum != expected or path != expected_path:
+                print(f"Part {part}, {name}: expected a {expected_path} giving {expected}")
+                ok = False
+    return ok
+
+
+def run_local_write_path(input_file='input.txt'):
+    """Run day1.lambda_handler in each write mode and check its S3 round-trips
+
+    Each case starts from a cold container and an absent output.txt, except
+    the warm repeat, which runs again right after the default case.
+    """
+    import day1
+
+    with open(input_file, 'rb') as file:
+        data = file.read()
+    expected = str(day1.stream_calibration_sum(io.BytesIO(data))).encode('utf-8')
+    cases = [
+        ('verified', {'write_mode': 'verified', 'result_cache': 'off'},
+         ['HeadBucket', 'GetObject', 'UploadFile', 'HeadObject']),
+        ('verified, cache on', {'write_mode': 'verified'},
+         ['HeadBucket', 'HeadObject', 'HeadObject', 'GetObject', 'UploadFile', 'HeadObject']),
+        ('lean, cache off', {'write_mode': 'lean', 'result_cache': 'off'}, ['GetObject', 'PutObject']),
+        ('default', {}, ['GetObject', 'PutObject']),
+        ('default, warm repeat', {}, ['GetObject', 'PutObject']),
+    ]
+    ok = True
+    for name, event, expected_operations in cases:
+        if name != 'default, warm repeat':
+            s3 = LocalS3({'advent-of-code-day': {'input.txt': data}})
+            day1.clients['s3'] = s3
+            day1.result_cache.clear()
+        first_call = len(s3.calls)
+        response = day1.lambda_handler(event, None)
+        operations = [operation for operation, _ in s3.calls[first_call:]]
+        print(f"{name}: {len(operations)} round-trips ({', '.join(operations)})")
+        if response['statusCode'] != 200 or s3.buckets['advent-of-code-day'].get('output.txt') != expected:
+            print(f"{name}: output.txt does not hold {expected.decode()}")
+            ok = False
+        if operations != expected_operations:
+            print(f"{name}: expected {', '.join(expected_operations)}")
+            ok = False
+
+    # An existing output is left alone when writes are conditional
+    s3.buckets['advent-of-code-day']['output.txt'] = b'stale'
+    response = day1.lambda_handler({'output_condition': 'if-none-match'}, None)
+    print(f"if-none-match over an existing output: {response['body']}")
+    return ok and response['statusCode'] == 200 and s3.buckets['advent-of-code-day']['output.txt'] == b'stale'
+
+
+def expected_polls(duration, initial_delay, backoff, max_delay):
+    """Number of get_query_execution calls the backoff schedule needs for a query of this duration"""
+    polls, elapsed, delay = 1, 0.0, initial_delay
+    while elapsed < duration:
+        elapsed += delay
+        delay = min(delay * backoff, max_delay)
+        polls += 1
+    return polls
+
+
+def run_local_athena(query_duration=0.3):
+    """Run lambda_athena against LocalAthena and check its polling and concurrency
+
+    main_async must create the calibration_lines table, a single query must
+    be polled on the runner's backoff schedule rather than at a fixed
+    interval, and no more than max_concurrency queries may run at once.
+    """
+    import asyncio
+    import lambda_athena
+
+    client = LocalAthena(duration=query_duration)
+    start = time.perf_counter()
+    asyncio.run(lambda_athena.main_async(lambda_athena.AthenaQueryRunner(client)))
+    elapsed = time.perf_counter() - start
+    print(f"Athena setup: {len(client.executions)} queries, {client.polls} polls, "
+          f"{client.max_running} at once, {elapsed:.2f}s")
+    ok = 'calibration_lines' in client.tables.get('advent_of_code_db', ())
+    if not ok:
+        print("The calibration_lines table was not created")
+
+    # One query of about a second: backoff needs a handful of polls, a fixed 50 ms interval about twenty
+    client = LocalAthena(duration=1.0)
+    runner = lambda_athena.AthenaQueryRunner(client, initial_delay=0.05, backoff=2.0, max_delay=5.0)
+    state, _ = asyncio.run(runner.run("SELECT 1", 'default', 's3://advent-of-code-day/query_results/'))
+    expected = expected_polls(1.0, 0.05, 2.0, 5.0)
+    print(f"Backoff: {client.polls} polls for a 1s query, schedule expects {expected}")
+    # One extra poll is allowed for event loop and thread pool jitter
+    if state != 'SUCCEEDED' or not expected <= client.polls <= expected + 1:
+        print(f"Polling did not follow the backoff schedule ({client.polls} polls, expected {expected})")
+        ok = False
+
+    # Six queries under a cap of two never have more than two in flight
+    client = LocalAthena(duration=0.2)
+    runner = lambda_athena.AthenaQueryRunner(client, max_concurrency=2)
+
+    async def run_all():
+        tasks = [runner.submit(f"SELECT {i}", 'default', 's3://advent-of-code-day/query_results/') for i in range(6)]
+        return await asyncio.gather(*tasks)
+
+    states = [state for state, _ in asyncio.run(run_all())]
+    print(f"Concurrency: {len(states)} queries, {client.max_running} at once with max_concurrency=2")
+    if states != ['SUCCEEDED'] * 6 or client.max_running != 2:
+        print(f"max_concurrency was not respected ({client.max_running} at once)")
+        ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    demo = sys.argv[1] if len(sys.argv) > 1 else 'fan_out'
+    if demo == 'athena':
+        if not run_local_athena():
+            raise SystemExit("The Athena checks failed")
+    elif demo == 'sharded':
+        if not run_local_sharded():
+            raise SystemExit("Sharded and streaming sums differ")
+    elif demo == 'incremental':
+        if not run_local_incremental():
+            raise SystemExit("Incremental and full-rescan sums differ")
+    elif demo == 'write_path':
+        if not run_local_write_path():
+            raise SystemExit("The write path checks failed")
+    elif not run_local_fan_out():
+        raise SystemExit("Fan-out and streaming sums differ")
@@ -8,6 +8,18 @@ terraform {
   }
 }
 
+variable "day1_layers" {
+  description = "Lambda layer ARNs for the day1 function, such as one providing pyarrow"
+  type        = list(string)
+  default     = []
+}
+
+variable "day1_write_mode" {
+  description = "How day1 writes output.txt: lean (one checksummed put_object) or verified (upload then head_object)"
+  type        = string
+  default     = "lean"
+}
+
 resource "aws_s3_bucket" "my_bucket" {
   bucket = "advent-of-code-day"
 }
@@ -36,18 +48,34 @@ resource "aws_iam_role" "lambda_exec_role" {
 
 locals {
   sql_script = <<EOF
--- Create an external table that points to the S3 bucket
-CREATE EXTERNAL TABLE IF NOT EXISTS advent_of_code_output (
-    line STRING
+-- Per-line calibration results written by day1.lambda_handler with EMIT_LINES=on,
+-- stored as Snappy-compressed Parquet and partitioned by source key and run date
+CREATE EXTERNAL TABLE IF NOT EXISTS calibration_lines (
+    line_number BIGINT,
+    first_digit TINYINT,
+    last_digit TINYINT,
+    value INT,
+    part TINYINT
 )
-ROW FORMAT DELIMITED
-FIELDS TERMINATED BY '\n'
-STORED AS TEXTFILE
-LOCATION 's3://advent-of-code-day/';
-
--- Query the data from the external table
-SELECT line
-FROM advent_of_code_output;
+PARTITIONED BY (source STRING, run_date STRING)
+STORED AS PARQUET
+LOCATION 's3://advent-of-code-day/calibration_lines/'
+TBLPROPERTIES (
+    'parquet.compression'='SNAPPY',
+    'projection.enabled'='true',
+    'projection.source.type'='injected',
+    'projection.run_date.type'='date',
+    'projection.run_date.format'='yyyy-MM-dd',
+    'projection.run_date.range'='2023-12-01,NOW',
+    'storage.location.template'='s3://advent-of-code-day/calibration_lines/source=$${source}/run_date=$${run_date}/'
+);
+
+-- Query one input's results from today's run (UTC); only that partition is scanned.
+-- day1 removes a source's partitions from earlier days, so each line is stored once
+SELECT part, count(*) AS lines, sum(value) AS total
+FROM calibration_lines
+WHERE source = 'input.txt' AND run_date = date_format(current_date, '%Y-%m-%d')
+GROUP BY part;
 EOF
 }
 
@@ -58,6 +86,9 @@ resource "aws_lambda_function" "day1_lambda" {
   runtime          = "python3.8"
   filename         = data.archive_file.day1_zip.output_path
   source_code_hash = data.archive_file.day1_zip.output_base64sha256
+  timeout          = 900
+  // EMIT_LINES needs pyarrow, e.g. from a layer listed here
+  layers           = var.day1_layers
 
   environment {
     variables = {
@@ -65,6 +96,7 @@ resource "aws_lambda_function" "day1_lambda" {
       SQL_SCRIPT    = local.sql_script
       ATHENA_DB     = aws_athena_database.advent_database.name
       ATHENA_OUTPUT = "s3://${aws_s3_bucket.my_bucket.bucket}/athena_results/"
+      WRITE_MODE    = var.day1_write_mode
     }
   }
 }
@@ -102,6 +134,7 @@ resource "aws_iam_role_policy" "lambda_s3_policy" {
           "s3:GetObject",
           "s3:ListBucket",
           "s3:PutObject",
+          "s3:DeleteObject",
           "s3:HeadObject",
           "s3:GetBucketAcl",
           "s3:CreateBucket",
@@ -118,6 +151,23 @@ resource "aws_iam_role_policy" "lambda_s3_policy" {
   })
 }
 
+// Fan-out mode invokes this same function once per byte range
+resource "aws_iam_role_policy" "lambda_fan_out_policy" {
+  name = "lambda_fan_out_policy"
+  role = aws_iam_role.lambda_exec_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["lambda:InvokeFunction"]
+        Resource = aws_lambda_function.day1_lambda.arn
+      }
+    ]
+  })
+}
+
 // Add IAM permissions for Athena and Glue
 resource "aws_iam_role_policy_attachment" "lambda_athena_policy" {
   role       = aws_iam_role.lambda_exec_role.name
@@ -177,18 +227,7 @@ resource "aws_athena_named_query" "example_query" {
   name      = "example_query"
   workgroup = aws_athena_workgroup.advent_workgroup.name
   database  = aws_athena_database.advent_database.name
-  query     = <<EOF
-CREATE EXTERNAL TABLE IF NOT EXISTS advent_table (
-  column1 int
-)
-ROW FORMAT DELIMITED
-FIELDS TERMINATED BY ','
-STORED AS TEXTFILE
-LOCATION 's3://${aws_s3_bucket.my_bucket.bucket}/';
-
-SELECT * FROM advent_table LIMIT 10;
-EOF
-
+  query     = local.sql_script
 }
 
 // Add this new resource
@@ -1,12 +1,37 @@
 import boto3
+import glob
+import hashlib
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 
-def upload_file_to_s3(file_name, bucket, object_name=None):
+# Files uploaded at once in bulk mode
+BULK_WORKERS = 16
+# Multipart settings shared by every upload. The skip check recomputes S3's
+# multipart ETag with the same threshold and chunk size, so keep them in step.
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True
+)
+
+
+def make_s3_client(max_pool_connections=BULK_WORKERS * TRANSFER_CONFIG.max_request_concurrency):
+    return boto3.client('s3', config=Config(max_pool_connections=max_pool_connections))
+
+
+def upload_file_to_s3(file_name, bucket, object_name=None, s3_client=None, transfer_config=TRANSFER_CONFIG):
     """Upload a file to an S3 bucket
 
     :param file_name: File to upload
     :param bucket: Bucket to upload to
     :param object_name: S3 object name. If not specified then file_name is used
+    :param s3_client: Client to upload with. If not specified a new one is created
+    :param transfer_config: Multipart chunk size and concurrency for the upload
     :return: True if file was uploaded, else False
     """
 
@@ -15,24 +40,118 @@ def upload_file_to_s3(file_name, bucket, object_name=None):
         object_name = file_name
 
     # Upload the file
-    s3_client = boto3.client('s3')
+    s3_client = s3_client or boto3.client('s3')
     try:
-        s3_client.upload_file(file_name, bucket, object_name)
+        s3_client.upload_file(file_name, bucket, object_name, Config=transfer_config)
     except Exception as e:
         print(f"Error uploading file: {str(e)}")
         return False
     return True
 
+
+def expand_paths(patterns):
+    """Turn files, directories and glob patterns into (local path, object name) pairs
+
+    Files keep the name they were given, as in single-file mode. Files found
+    in a directory are named relative to it, and glob matches are named as
+    matched.
+    """
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    yield path, os.path.relpath(path, pattern).replace(os.sep, '/')
+        elif os.path.isfile(pattern):
+            yield pattern, pattern.replace(os.sep, '/')
+        else:
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(path):
+                    yield path, path.replace(os.sep, '/')
+
+
+def local_etag(file_name, transfer_config=TRANSFER_CONFIG):
+    """Compute the ETag S3 gives this file when uploaded with transfer_config
+
+    Single-part uploads get the MD5 of the content, multipart uploads the MD5
+    of the concatenated part MD5s followed by the part count.
+    """
+    chunk_size = transfer_config.multipart_chunksize
+    part_digests = []
+    with open(file_name, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            part_digests.append(hashlib.md5(chunk).digest())
+    if os.path.getsize(file_name) < transfer_config.multipart_threshold:
+        return (part_digests[0] if part_digests else hashlib.md5(b'').digest()).hex()
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+def remote_etags(s3_client, bucket, prefix=''):
+    # One listing instead of a head_object per file
+    etags = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get('Contents', []):
+            etags[item['Key']] = item['ETag'].strip('"')
+    return etags
+
+
+def bulk_upload(patterns, bucket, prefix='', max_workers=BULK_WORKERS, transfer_config=TRANSFER_CONFIG, s3_client=None):
+    """Upload many files at once over one pooled client
+
+    Files whose content already matches the remote object's ETag are skipped.
+
+    :param patterns: Files, directories or glob patterns to upload
+    :param bucket: Bucket to upload to
+    :param prefix: Prepended to every object name
+    :param max_workers: Number of files uploaded at once
+    :return: Dict of uploaded, skipped and failed counts, bytes uploaded and seconds taken
+    """
+    s3_client = s3_client or make_s3_client(max_workers * transfer_config.max_request_concurrency)
+    files = [(path, prefix + object_name) for path, object_name in expand_paths(patterns)]
+    keys = [object_name for _, object_name in files]
+    existing = remote_etags(s3_client, bucket, os.path.commonprefix(keys)) if keys else {}
+
+    def upload(item):
+        path, object_name = item
+        # Only hash files that already have a remote copy to compare with
+        if object_name in existing and existing[object_name] == local_etag(path, transfer_config):
+            return 'skipped', 0
+        if upload_file_to_s3(path, bucket, object_name, s3_client, transfer_config):
+            return 'uploaded', os.path.getsize(path)
+        return 'failed', 0
+
+    stats = {'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for status, size in executor.map(upload, files):
+            stats[status] += 1
+            stats['bytes'] += size
+    stats['seconds'] = time.perf_counter() - start
+
+    megabytes = stats['bytes'] / 1e6
+    rate = megabytes / stats['seconds'] if stats['seconds'] else 0.0
+    print(f"Uploaded {stats['uploaded']} files ({megabytes:.1f} MB) in {stats['seconds']:.1f}s, {rate:.1f} MB/s, "
+          f"{stats['uploaded'] / stats['seconds'] if stats['seconds'] else 0.0:.1f} files/s; "
+          f"skipped {stats['skipped']} unchanged, {stats['failed']} failed")
+    return stats
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
+    if len(sys.argv) < 3:
         print("Usage: python upload_to_s3.py <file_name> <bucket_name>")
+        print("       python upload_to_s3.py <file_dir_or_glob>... <bucket_name>")
         sys.exit(1)
 
-    file_name = sys.argv[1]
-    bucket_name = sys.argv[2]
+    paths = sys.argv[1:-1]
+    bucket_name = sys.argv[-1]
 
-    if upload_file_to_s3(file_name, bucket_name):
-        print(f"Successfully uploaded {file_name} to {bucket_name}")
-    else:
-        print(f"Failed to upload {file_name} to {bucket_name}")
-        sys.exit(1)
\ No newline at end of file
+    if len(paths) == 1 and os.path.isfile(paths[0]):
+        file_name = paths[0]
+        if upload_file_to_s3(file_name, bucket_name):
+            print(f"Successfully uploaded {file_name} to {bucket_name}")
+        else:
+            print(f"Failed to upload {file_name} to {bucket_name}")
+            sys.exit(1)
+    elif bulk_upload(paths, bucket_name)['failed']:
+        sys.exit(1)